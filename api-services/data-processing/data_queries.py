@@ -1,178 +1,407 @@
 """
 Data Query Module
 Provides functions to query processed SAP data
+
+get_customer_orders relies on the covering index created in data-pipeline/sql-scripts/create-tables.sql:
+    IX_Sales_CustomerID_SalesDate ON Sales (CustomerID, IsActive, SalesDate DESC)
+    INCLUDE (OrderNumber, ProductCode, SalesAmount, SalesQuantity, UnitPrice, Region, Channel, SalesRep)
 """
 
+import asyncio
+import functools
 import logging
-import json
-import pandas as pd
+import io
+import orjson
 import pyodbc
+import threading
+from contextlib import closing, contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from decimal import Decimal
+from itertools import compress, product
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple
+from cachetools import TTLCache
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 import os
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from .sql_pool import get_conn
+
 logger = logging.getLogger(__name__)
 
+# SQLSTATE returned by the ODBC driver when authentication is rejected
+SQLSTATE_LOGIN_FAILED = '28000'
+
+# Rows fetched per driver round-trip on result-set cursors
+CURSOR_ARRAYSIZE = int(os.environ.get('SQL_CURSOR_ARRAYSIZE', '200'))
+
+# Up to this many IDs, get_customers_bulk issues point lookups instead of a table-valued parameter call
+BULK_LOOKUP_MIN_IDS = 2
+
+# How long aggregate query results are served from memory
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '300'))
+
+def _iter_records(cursor: pyodbc.Cursor) -> Iterator[Dict[str, Any]]:
+    """Yield result rows as dicts, fetching cursor.arraysize rows per round-trip"""
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(columns, row))
+
+# orjson encodes str/int/float/datetime/date/uuid itself; only these types reach the default hook.
+# Values are mostly pre-converted in the SQL projections, so the hook is rarely hit at all.
+_JSON_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    Decimal: float,
+    bytes: bytes.hex,
+}
+_JSON_OPTIONS = orjson.OPT_NAIVE_UTC
+
+def _json_default(value: Any) -> Any:
+    """Convert values orjson cannot serialize natively"""
+    return _JSON_CONVERTERS.get(type(value), str)(value)
+
+def _dumps(data: Any) -> bytes:
+    """Serialize query results to UTF-8 JSON bytes, ready to send without re-encoding"""
+    return orjson.dumps(data, default=_json_default, option=_JSON_OPTIONS)
+
+def _dumps_rows(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """Serialize rows to a JSON array one row at a time, without building the full list first"""
+    buffer = io.BytesIO()
+    buffer.write(b'[')
+    for index, row in enumerate(rows):
+        if index:
+            buffer.write(b',')
+        buffer.write(orjson.dumps(row, default=_json_default, option=_JSON_OPTIONS))
+    buffer.write(b']')
+    return buffer.getvalue()
+
+def _query_variants(template: str, base_conditions: List[str], filters: List[str]) -> Dict[Tuple[bool, ...], str]:
+    """
+    Render the SQL text for every combination of optional filters, keyed by a tuple flagging which
+    filters apply. Stable SQL text lets SQL Server reuse cached plans.
+    """
+    return {
+        present: template.format(where_clause=" AND ".join(base_conditions + list(compress(filters, present))))
+        for present in product((False, True), repeat=len(filters))
+    }
+
+def _filter_args(*values: Optional[Any]) -> Tuple[Tuple[bool, ...], List[Any]]:
+    """Get the variant key and bind parameters for the optional filter values, in template order"""
+    present = tuple(map(bool, values))
+    return present, list(compress(values, present))
+
+_CUSTOMER_DATA_QUERY = """
+    SELECT 
+        c.CustomerID,
+        c.CustomerSegment,
+        c.Region,
+        c.SalesRep,
+        c.TotalOrders,
+        ISNULL(CAST(c.TotalSalesAmount AS FLOAT), 0) as TotalSalesAmount,
+        CONVERT(VARCHAR(33), c.LastOrderDate, 126) as LastOrderDate,
+        CONVERT(VARCHAR(33), c.CreatedDate, 126) as CreatedDate,
+        CONVERT(VARCHAR(33), c.UpdatedDate, 126) as UpdatedDate
+    FROM Customers c
+    WHERE c.CustomerID = ? AND c.IsActive = 1
+"""
+
+_CUSTOMER_ORDERS_QUERY = """
+    SELECT TOP (?)
+        s.OrderNumber,
+        CONVERT(VARCHAR(33), s.SalesDate, 126) as SalesDate,
+        s.ProductCode,
+        CAST(s.SalesAmount AS FLOAT) as SalesAmount,
+        CAST(s.SalesQuantity AS FLOAT) as SalesQuantity,
+        CAST(s.UnitPrice AS FLOAT) as UnitPrice,
+        s.Region,
+        s.Channel,
+        s.SalesRep
+    FROM Sales s WITH (INDEX(IX_Sales_CustomerID_SalesDate))
+    WHERE s.CustomerID = ? AND s.IsActive = 1
+    ORDER BY s.SalesDate DESC
+"""
+
+def _customer_row_to_dict(row: pyodbc.Row) -> Dict[str, Any]:
+    """Map a _CUSTOMER_DATA_QUERY or dbo.GetCustomersBulk row to the customer API shape"""
+    return {
+        'customer_id': row[0],
+        'customer_segment': row[1],
+        'region': row[2],
+        'sales_rep': row[3],
+        'total_orders': row[4],
+        'total_sales_amount': row[5],
+        'last_order_date': row[6],
+        'created_date': row[7],
+        'updated_date': row[8]
+    }
+
+_SALES_DATA_QUERIES = _query_variants("""
+    SELECT 
+        s.CustomerID,
+        s.ProductCode,
+        s.OrderNumber,
+        CONVERT(VARCHAR(33), s.SalesDate, 126) as SalesDate,
+        CAST(s.SalesAmount AS FLOAT) as SalesAmount,
+        CAST(s.SalesQuantity AS FLOAT) as SalesQuantity,
+        CAST(s.UnitPrice AS FLOAT) as UnitPrice,
+        s.Region,
+        s.Channel,
+        s.SalesRep,
+        s.DataSource,
+        c.CustomerSegment
+    FROM Sales s
+    LEFT JOIN Customers c ON s.CustomerID = c.CustomerID
+    WHERE {where_clause}
+    ORDER BY s.SalesDate DESC
+""", ["s.IsActive = 1"], ["s.SalesDate >= ?", "s.SalesDate <= ?", "s.Region = ?", "s.CustomerID = ?"])
+
+_PRODUCT_PERFORMANCE_QUERIES = _query_variants("""
+    SELECT 
+        s.ProductCode,
+        COUNT(*) as TotalSales,
+        CAST(SUM(s.SalesQuantity) AS FLOAT) as TotalQuantitySold,
+        CAST(SUM(s.SalesAmount) AS FLOAT) as TotalSalesAmount,
+        CAST(AVG(s.UnitPrice) AS FLOAT) as AverageUnitPrice,
+        CONVERT(VARCHAR(33), MIN(s.SalesDate), 126) as FirstSaleDate,
+        CONVERT(VARCHAR(33), MAX(s.SalesDate), 126) as LastSaleDate
+    FROM Sales s
+    WHERE {where_clause}
+    GROUP BY s.ProductCode
+    ORDER BY TotalSalesAmount DESC
+""", ["s.IsActive = 1"], ["s.ProductCode = ?", "s.SalesDate >= ?", "s.SalesDate <= ?"])
+
+_REGIONAL_SALES_QUERIES = _query_variants("""
+    SELECT 
+        s.Region,
+        COUNT(*) as TotalSales,
+        COUNT(DISTINCT s.CustomerID) as UniqueCustomers,
+        CAST(SUM(s.SalesQuantity) AS FLOAT) as TotalQuantitySold,
+        CAST(SUM(s.SalesAmount) AS FLOAT) as TotalSalesAmount,
+        CAST(AVG(s.SalesAmount) AS FLOAT) as AverageSaleAmount
+    FROM Sales s
+    WHERE {where_clause}
+    GROUP BY s.Region
+    ORDER BY TotalSalesAmount DESC
+""", ["s.IsActive = 1"], ["s.SalesDate >= ?", "s.SalesDate <= ?"])
+
+_SALES_REP_PERFORMANCE_QUERIES = _query_variants("""
+    SELECT 
+        s.SalesRep,
+        COUNT(*) as TotalSales,
+        COUNT(DISTINCT s.CustomerID) as UniqueCustomers,
+        CAST(SUM(s.SalesQuantity) AS FLOAT) as TotalQuantitySold,
+        CAST(SUM(s.SalesAmount) AS FLOAT) as TotalSalesAmount,
+        CAST(AVG(s.SalesAmount) AS FLOAT) as AverageSaleAmount
+    FROM Sales s
+    WHERE {where_clause}
+    GROUP BY s.SalesRep
+    ORDER BY TotalSalesAmount DESC
+""", ["s.IsActive = 1", "s.SalesRep IS NOT NULL"], ["s.SalesDate >= ?", "s.SalesDate <= ?"])
+
+_TOP_CUSTOMERS_QUERIES = _query_variants("""
+    SELECT 
+        s.CustomerID,
+        c.CustomerSegment,
+        c.Region,
+        c.SalesRep,
+        COUNT(*) as TotalOrders,
+        CAST(SUM(s.SalesQuantity) AS FLOAT) as TotalQuantityPurchased,
+        CAST(SUM(s.SalesAmount) AS FLOAT) as TotalSalesAmount,
+        CAST(AVG(s.SalesAmount) AS FLOAT) as AverageOrderValue,
+        CONVERT(VARCHAR(33), MAX(s.SalesDate), 126) as LastOrderDate
+    FROM Sales s
+    LEFT JOIN Customers c ON s.CustomerID = c.CustomerID
+    WHERE {where_clause}
+    GROUP BY s.CustomerID, c.CustomerSegment, c.Region, c.SalesRep
+    ORDER BY TotalSalesAmount DESC
+    OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+""", ["s.IsActive = 1"], ["s.SalesDate >= ?", "s.SalesDate <= ?"])
+
+# Credential and Key Vault client shared by every service instance in the process
+KEY_VAULT_URL = os.environ.get('KEY_VAULT_URL')
+_CREDENTIAL = DefaultAzureCredential(exclude_interactive_browser_credential=True)
+_SECRET_CLIENT = SecretClient(vault_url=KEY_VAULT_URL, credential=_CREDENTIAL) if KEY_VAULT_URL else None
+
+@functools.lru_cache(maxsize=None)
+def _get_secret(name: str) -> str:
+    """Get a Key Vault secret value, cached until the cache is cleared after an auth failure"""
+    return _SECRET_CLIENT.get_secret(name).value
+
+# ProductCode -> ProductCategory lookup shared by the queries that used to join Products
+_PRODUCT_CATEGORY_CACHE: TTLCache = TTLCache(maxsize=1, ttl=CACHE_TTL_SECONDS)
+_PRODUCT_CATEGORY_LOCK = threading.Lock()
+
 class DataQueryService:
     def __init__(self):
-        self.credential = DefaultAzureCredential()
-        self.key_vault_url = os.environ.get('KEY_VAULT_URL')
+        self.credential = _CREDENTIAL
+        self.key_vault_url = KEY_VAULT_URL
         self.sql_connection_string = os.environ.get('SQL_CONNECTION_STRING')
-        
-        if self.key_vault_url:
-            self.secret_client = SecretClient(
-                vault_url=self.key_vault_url,
-                credential=self.credential
-            )
-        else:
-            self.secret_client = None
+        self.secret_client = _SECRET_CLIENT
+
+        self._cached_connection_string: Optional[str] = None
 
     def get_connection_string(self) -> str:
-        """Get SQL connection string from environment or Key Vault"""
+        """Get SQL connection string from environment or Key Vault, cached after the first lookup"""
+        if self._cached_connection_string:
+            return self._cached_connection_string
+
         if self.sql_connection_string:
-            return self.sql_connection_string
+            self._cached_connection_string = self.sql_connection_string
         elif self.secret_client:
-            secret = self.secret_client.get_secret("sql-connection-string")
-            return secret.value
+            self._cached_connection_string = _get_secret("sql-connection-string")
         else:
             raise ValueError("No SQL connection string available")
 
+        return self._cached_connection_string
+
+    def refresh_connection_string(self) -> None:
+        """Drop the cached connection string so the next query re-reads it (e.g. after secret rotation)"""
+        self._cached_connection_string = None
+        _get_secret.cache_clear()
+
+    @contextmanager
+    def _connection(self) -> Iterator[pyodbc.Connection]:
+        """Borrow a pooled connection, refreshing the cached connection string on login failures"""
+        try:
+            with get_conn(self.get_connection_string()) as conn:
+                yield conn
+        except pyodbc.Error as e:
+            if e.args and e.args[0] == SQLSTATE_LOGIN_FAILED:
+                logger.warning("SQL login failed, refreshing cached connection string")
+                self.refresh_connection_string()
+            raise
+
+    def _read_records(self, conn: pyodbc.Connection, query: str, params: List[Any]) -> List[Dict[str, Any]]:
+        """Execute a query on a cursor with a large fetch array size and return the rows as dicts"""
+        with closing(conn.cursor()) as cursor:
+            cursor.arraysize = CURSOR_ARRAYSIZE
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_product_categories(self) -> Dict[str, Optional[str]]:
+        """Get the ProductCode -> ProductCategory lookup, reloaded from the small Products table after CACHE_TTL_SECONDS"""
+        with _PRODUCT_CATEGORY_LOCK:
+            categories = _PRODUCT_CATEGORY_CACHE.get('categories')
+        if categories is not None:
+            return categories
+        
+        # Fetch without the lock so concurrent requests are not queued behind one round trip;
+        # an occasional duplicate load after expiry is cheaper than serializing every caller
+        with self._connection() as conn, closing(conn.cursor()) as cursor:
+            cursor.arraysize = CURSOR_ARRAYSIZE
+            cursor.execute("SELECT ProductCode, ProductCategory FROM Products")
+            categories = {code: category for code, category in cursor.fetchall()}
+        
+        with _PRODUCT_CATEGORY_LOCK:
+            _PRODUCT_CATEGORY_CACHE['categories'] = categories
+        return categories
+
+    def _add_product_categories(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill in ProductCategory from the cached lookup instead of joining Products in SQL"""
+        categories = self.get_product_categories()
+        for record in records:
+            record['ProductCategory'] = categories.get(record['ProductCode'])
+        return records
+
     def get_customer_data(self, customer_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed customer data by customer ID"""
         try:
-            connection_string = self.get_connection_string()
-            query = """
-                SELECT 
-                    c.CustomerID,
-                    c.CustomerSegment,
-                    c.Region,
-                    c.SalesRep,
-                    c.TotalOrders,
-                    c.TotalSalesAmount,
-                    c.LastOrderDate,
-                    c.CreatedDate,
-                    c.UpdatedDate
-                FROM Customers c
-                WHERE c.CustomerID = ? AND c.IsActive = 1
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, customer_id)
+            # The cursor is closed before the connection goes back to the pool, even on the early return
+            with self._connection() as conn, closing(conn.cursor()) as cursor:
+                cursor.execute(_CUSTOMER_DATA_QUERY, customer_id)
                 row = cursor.fetchone()
                 
-                if row:
-                    return {
-                        'customer_id': row[0],
-                        'customer_segment': row[1],
-                        'region': row[2],
-                        'sales_rep': row[3],
-                        'total_orders': row[4],
-                        'total_sales_amount': float(row[5]) if row[5] else 0,
-                        'last_order_date': row[6].isoformat() if row[6] else None,
-                        'created_date': row[7].isoformat() if row[7] else None,
-                        'updated_date': row[8].isoformat() if row[8] else None
-                    }
-                else:
-                    return None
+                return _customer_row_to_dict(row) if row else None
                     
         except Exception as e:
-            logger.error(f"Error getting customer data: {str(e)}")
+            logger.error("Error getting customer data: %s", e)
+            raise
+
+    def get_customers_bulk(self, customer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get customer data for several customer IDs, keyed by customer ID"""
+        unique_ids = list(dict.fromkeys(customer_ids))
+        
+        # A table-valued parameter only pays off once it replaces more than a couple of point lookups
+        if len(unique_ids) <= BULK_LOOKUP_MIN_IDS:
+            customers = (self.get_customer_data(customer_id) for customer_id in unique_ids)
+            return {customer['customer_id']: customer for customer in customers if customer}
+        
+        try:
+            with self._connection() as conn, closing(conn.cursor()) as cursor:
+                cursor.arraysize = CURSOR_ARRAYSIZE
+                cursor.execute("{CALL dbo.GetCustomersBulk (?)}", [[(customer_id,) for customer_id in unique_ids]])
+                customers = [_customer_row_to_dict(row) for row in cursor.fetchall()]
+            
+            return {customer['customer_id']: customer for customer in customers}
+                
+        except Exception as e:
+            logger.error("Error getting customers in bulk: %s", e)
             raise
 
     def get_sales_data(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
                       region: Optional[str] = None, customer_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get sales data with optional filters"""
+        return list(self.iter_sales_data(start_date, end_date, region, customer_id))
+
+    def iter_sales_data(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       region: Optional[str] = None, customer_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream sales data with optional filters, holding the connection until the rows are consumed"""
         try:
-            connection_string = self.get_connection_string()
+            variant, params = _filter_args(start_date, end_date, region, customer_id)
+            query = _SALES_DATA_QUERIES[variant]
+            categories = self.get_product_categories()
             
-            # Build dynamic query
-            where_conditions = ["s.IsActive = 1"]
-            params = []
-            
-            if start_date:
-                where_conditions.append("s.SalesDate >= ?")
-                params.append(start_date)
-            
-            if end_date:
-                where_conditions.append("s.SalesDate <= ?")
-                params.append(end_date)
-            
-            if region:
-                where_conditions.append("s.Region = ?")
-                params.append(region)
-            
-            if customer_id:
-                where_conditions.append("s.CustomerID = ?")
-                params.append(customer_id)
-            
-            where_clause = " AND ".join(where_conditions)
-            
-            query = f"""
-                SELECT 
-                    s.CustomerID,
-                    s.ProductCode,
-                    s.OrderNumber,
-                    s.SalesDate,
-                    s.SalesAmount,
-                    s.SalesQuantity,
-                    s.UnitPrice,
-                    s.Region,
-                    s.Channel,
-                    s.SalesRep,
-                    s.DataSource,
-                    c.CustomerSegment,
-                    p.ProductCategory
-                FROM Sales s
-                LEFT JOIN Customers c ON s.CustomerID = c.CustomerID
-                LEFT JOIN Products p ON s.ProductCode = p.ProductCode
-                WHERE {where_clause}
-                ORDER BY s.SalesDate DESC
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn, params=params)
-                
-                return df.to_dict('records')
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.arraysize = CURSOR_ARRAYSIZE
+                try:
+                    cursor.execute(query, params)
+                    for record in _iter_records(cursor):
+                        record['ProductCategory'] = categories.get(record['ProductCode'])
+                        yield record
+                finally:
+                    cursor.close()
                 
         except Exception as e:
-            logger.error(f"Error getting sales data: {str(e)}")
+            logger.error("Error getting sales data: %s", e)
             raise
 
     def get_customer_orders(self, customer_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get recent orders for a specific customer"""
         try:
-            connection_string = self.get_connection_string()
-            query = """
-                SELECT 
-                    s.OrderNumber,
-                    s.SalesDate,
-                    s.ProductCode,
-                    s.SalesAmount,
-                    s.SalesQuantity,
-                    s.UnitPrice,
-                    s.Region,
-                    s.Channel,
-                    s.SalesRep,
-                    p.ProductCategory
-                FROM Sales s
-                LEFT JOIN Products p ON s.ProductCode = p.ProductCode
-                WHERE s.CustomerID = ? AND s.IsActive = 1
-                ORDER BY s.SalesDate DESC
-                OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
-            """
+            with self._connection() as conn:
+                orders = self._read_records(conn, _CUSTOMER_ORDERS_QUERY, [limit, customer_id])
             
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn, params=[customer_id, limit])
+            return self._add_product_categories(orders)
+                
+        except Exception as e:
+            logger.error("Error getting customer orders: %s", e)
+            raise
+
+    def get_customer_profile(self, customer_id: str, limit: int = 50) -> Optional[Dict[str, Any]]:
+        """Get customer data and recent orders in a single round-trip"""
+        try:
+            # Closing the cursor also discards the unread orders result set when the customer does not exist
+            with self._connection() as conn, closing(conn.cursor()) as cursor:
+                cursor.arraysize = CURSOR_ARRAYSIZE
+                cursor.execute(_CUSTOMER_DATA_QUERY + ";" + _CUSTOMER_ORDERS_QUERY, [customer_id, limit, customer_id])
+                row = cursor.fetchone()
                 
-                return df.to_dict('records')
+                if not row:
+                    return None
+                
+                customer = _customer_row_to_dict(row)
+                cursor.nextset()
+                columns = [column[0] for column in cursor.description]
+                orders = [dict(zip(columns, order)) for order in cursor.fetchall()]
+            
+            return {'customer': customer, 'orders': self._add_product_categories(orders)}
                 
         except Exception as e:
-            logger.error(f"Error getting customer orders: {str(e)}")
+            logger.error("Error getting customer profile: %s", e)
             raise
 
     def get_product_performance(self, product_code: Optional[str] = None, 
@@ -180,228 +409,156 @@ class DataQueryService:
                               end_date: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get product performance data"""
         try:
-            connection_string = self.get_connection_string()
-            
-            where_conditions = ["s.IsActive = 1"]
-            params = []
-            
-            if product_code:
-                where_conditions.append("s.ProductCode = ?")
-                params.append(product_code)
+            variant, params = _filter_args(product_code, start_date, end_date)
+            query = _PRODUCT_PERFORMANCE_QUERIES[variant]
             
-            if start_date:
-                where_conditions.append("s.SalesDate >= ?")
-                params.append(start_date)
+            with self._connection() as conn:
+                products = self._read_records(conn, query, params)
             
-            if end_date:
-                where_conditions.append("s.SalesDate <= ?")
-                params.append(end_date)
-            
-            where_clause = " AND ".join(where_conditions)
-            
-            query = f"""
-                SELECT 
-                    s.ProductCode,
-                    p.ProductCategory,
-                    COUNT(*) as TotalSales,
-                    SUM(s.SalesQuantity) as TotalQuantitySold,
-                    SUM(s.SalesAmount) as TotalSalesAmount,
-                    AVG(s.UnitPrice) as AverageUnitPrice,
-                    MIN(s.SalesDate) as FirstSaleDate,
-                    MAX(s.SalesDate) as LastSaleDate
-                FROM Sales s
-                LEFT JOIN Products p ON s.ProductCode = p.ProductCode
-                WHERE {where_clause}
-                GROUP BY s.ProductCode, p.ProductCategory
-                ORDER BY TotalSalesAmount DESC
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn, params=params)
-                
-                return df.to_dict('records')
+            return self._add_product_categories(products)
                 
         except Exception as e:
-            logger.error(f"Error getting product performance: {str(e)}")
+            logger.error("Error getting product performance: %s", e)
             raise
 
     def get_regional_sales(self, start_date: Optional[str] = None, 
                           end_date: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get sales data by region"""
         try:
-            connection_string = self.get_connection_string()
-            
-            where_conditions = ["s.IsActive = 1"]
-            params = []
-            
-            if start_date:
-                where_conditions.append("s.SalesDate >= ?")
-                params.append(start_date)
+            variant, params = _filter_args(start_date, end_date)
+            query = _REGIONAL_SALES_QUERIES[variant]
             
-            if end_date:
-                where_conditions.append("s.SalesDate <= ?")
-                params.append(end_date)
-            
-            where_clause = " AND ".join(where_conditions)
-            
-            query = f"""
-                SELECT 
-                    s.Region,
-                    COUNT(*) as TotalSales,
-                    COUNT(DISTINCT s.CustomerID) as UniqueCustomers,
-                    SUM(s.SalesQuantity) as TotalQuantitySold,
-                    SUM(s.SalesAmount) as TotalSalesAmount,
-                    AVG(s.SalesAmount) as AverageSaleAmount
-                FROM Sales s
-                WHERE {where_clause}
-                GROUP BY s.Region
-                ORDER BY TotalSalesAmount DESC
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn, params=params)
-                
-                return df.to_dict('records')
+            with self._connection() as conn:
+                return self._read_records(conn, query, params)
                 
         except Exception as e:
-            logger.error(f"Error getting regional sales: {str(e)}")
+            logger.error("Error getting regional sales: %s", e)
             raise
 
     def get_sales_rep_performance(self, start_date: Optional[str] = None, 
                                  end_date: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get sales rep performance data"""
         try:
-            connection_string = self.get_connection_string()
-            
-            where_conditions = ["s.IsActive = 1", "s.SalesRep IS NOT NULL"]
-            params = []
-            
-            if start_date:
-                where_conditions.append("s.SalesDate >= ?")
-                params.append(start_date)
-            
-            if end_date:
-                where_conditions.append("s.SalesDate <= ?")
-                params.append(end_date)
+            variant, params = _filter_args(start_date, end_date)
+            query = _SALES_REP_PERFORMANCE_QUERIES[variant]
             
-            where_clause = " AND ".join(where_conditions)
-            
-            query = f"""
-                SELECT 
-                    s.SalesRep,
-                    COUNT(*) as TotalSales,
-                    COUNT(DISTINCT s.CustomerID) as UniqueCustomers,
-                    SUM(s.SalesQuantity) as TotalQuantitySold,
-                    SUM(s.SalesAmount) as TotalSalesAmount,
-                    AVG(s.SalesAmount) as AverageSaleAmount
-                FROM Sales s
-                WHERE {where_clause}
-                GROUP BY s.SalesRep
-                ORDER BY TotalSalesAmount DESC
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn, params=params)
-                
-                return df.to_dict('records')
+            with self._connection() as conn:
+                return self._read_records(conn, query, params)
                 
         except Exception as e:
-            logger.error(f"Error getting sales rep performance: {str(e)}")
+            logger.error("Error getting sales rep performance: %s", e)
             raise
 
     def get_top_customers(self, limit: int = 10, start_date: Optional[str] = None, 
                          end_date: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get top customers by sales amount"""
         try:
-            connection_string = self.get_connection_string()
-            
-            where_conditions = ["s.IsActive = 1"]
-            params = []
-            
-            if start_date:
-                where_conditions.append("s.SalesDate >= ?")
-                params.append(start_date)
-            
-            if end_date:
-                where_conditions.append("s.SalesDate <= ?")
-                params.append(end_date)
-            
-            where_clause = " AND ".join(where_conditions)
-            
-            query = f"""
-                SELECT 
-                    s.CustomerID,
-                    c.CustomerSegment,
-                    c.Region,
-                    c.SalesRep,
-                    COUNT(*) as TotalOrders,
-                    SUM(s.SalesQuantity) as TotalQuantityPurchased,
-                    SUM(s.SalesAmount) as TotalSalesAmount,
-                    AVG(s.SalesAmount) as AverageOrderValue,
-                    MAX(s.SalesDate) as LastOrderDate
-                FROM Sales s
-                LEFT JOIN Customers c ON s.CustomerID = c.CustomerID
-                WHERE {where_clause}
-                GROUP BY s.CustomerID, c.CustomerSegment, c.Region, c.SalesRep
-                ORDER BY TotalSalesAmount DESC
-                OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
-            """
+            variant, params = _filter_args(start_date, end_date)
+            query = _TOP_CUSTOMERS_QUERIES[variant]
             
             params.append(limit)
             
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn, params=params)
-                
-                return df.to_dict('records')
+            with self._connection() as conn:
+                return self._read_records(conn, query, params)
                 
         except Exception as e:
-            logger.error(f"Error getting top customers: {str(e)}")
+            logger.error("Error getting top customers: %s", e)
             raise
 
+# Shared service instance, reused across invocations handled by the same worker process
+_SERVICE: Optional[DataQueryService] = None
+_SERVICE_LOCK = threading.Lock()
+
+def _get_service() -> DataQueryService:
+    """Get the process-wide DataQueryService, creating it on first use"""
+    global _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _SERVICE = DataQueryService()
+    return _SERVICE
+
+# Serialized results of the read-only aggregate queries, keyed by query name and filter values
+_QUERY_CACHE: TTLCache = TTLCache(maxsize=256, ttl=CACHE_TTL_SECONDS)
+_QUERY_CACHE_LOCK = threading.Lock()
+
+def _cached_json(key: Tuple[Any, ...], load: Callable[[], Any]) -> bytes:
+    """Return the cached JSON for key, running the query and serializing it on a miss"""
+    with _QUERY_CACHE_LOCK:
+        payload = _QUERY_CACHE.get(key)
+    if payload is None:
+        payload = _dumps(load())
+        with _QUERY_CACHE_LOCK:
+            _QUERY_CACHE[key] = payload
+    return payload
+
 # Convenience functions for Azure Functions
 def get_customer_data(customer_id: str) -> Optional[Dict[str, Any]]:
     """Get customer data by ID"""
-    service = DataQueryService()
-    return service.get_customer_data(customer_id)
+    return _get_service().get_customer_data(customer_id)
+
+def get_customer_json(customer_id: str) -> Optional[bytes]:
+    """Get customer data by ID as UTF-8 JSON bytes, or None if the customer does not exist"""
+    data = _get_service().get_customer_data(customer_id)
+    return _dumps(data) if data else None
+
+def get_customers_bulk(customer_ids: List[str]) -> bytes:
+    """Get customer data for several customer IDs as UTF-8 JSON bytes"""
+    data = _get_service().get_customers_bulk(customer_ids)
+    return _dumps(data)
+
+def get_customer_profile(customer_id: str, limit: int = 50) -> Optional[bytes]:
+    """Get customer data with recent orders as UTF-8 JSON bytes, or None if the customer does not exist"""
+    data = _get_service().get_customer_profile(customer_id, limit)
+    return _dumps(data) if data else None
 
 def get_sales_data(start_date: Optional[str] = None, end_date: Optional[str] = None,
-                  region: Optional[str] = None, customer_id: Optional[str] = None) -> str:
-    """Get sales data as JSON string"""
-    service = DataQueryService()
-    data = service.get_sales_data(start_date, end_date, region, customer_id)
-    return json.dumps(data, default=str)
-
-def get_customer_orders(customer_id: str, limit: int = 50) -> str:
-    """Get customer orders as JSON string"""
-    service = DataQueryService()
-    data = service.get_customer_orders(customer_id, limit)
-    return json.dumps(data, default=str)
+                  region: Optional[str] = None, customer_id: Optional[str] = None) -> bytes:
+    """Get sales data as UTF-8 JSON bytes"""
+    rows = _get_service().iter_sales_data(start_date, end_date, region, customer_id)
+    return _dumps_rows(rows)
+
+def get_customer_orders(customer_id: str, limit: int = 50) -> bytes:
+    """Get customer orders as UTF-8 JSON bytes"""
+    data = _get_service().get_customer_orders(customer_id, limit)
+    return _dumps(data)
 
 def get_product_performance(product_code: Optional[str] = None, 
                           start_date: Optional[str] = None, 
-                          end_date: Optional[str] = None) -> str:
-    """Get product performance as JSON string"""
-    service = DataQueryService()
-    data = service.get_product_performance(product_code, start_date, end_date)
-    return json.dumps(data, default=str)
+                          end_date: Optional[str] = None) -> bytes:
+    """Get product performance as UTF-8 JSON bytes"""
+    return _cached_json(('product_performance', product_code, start_date, end_date),
+                        lambda: _get_service().get_product_performance(product_code, start_date, end_date))
 
 def get_regional_sales(start_date: Optional[str] = None, 
-                      end_date: Optional[str] = None) -> str:
-    """Get regional sales as JSON string"""
-    service = DataQueryService()
-    data = service.get_regional_sales(start_date, end_date)
-    return json.dumps(data, default=str)
+                      end_date: Optional[str] = None) -> bytes:
+    """Get regional sales as UTF-8 JSON bytes"""
+    return _cached_json(('regional_sales', start_date, end_date),
+                        lambda: _get_service().get_regional_sales(start_date, end_date))
 
 def get_sales_rep_performance(start_date: Optional[str] = None, 
-                             end_date: Optional[str] = None) -> str:
-    """Get sales rep performance as JSON string"""
-    service = DataQueryService()
-    data = service.get_sales_rep_performance(start_date, end_date)
-    return json.dumps(data, default=str)
+                             end_date: Optional[str] = None) -> bytes:
+    """Get sales rep performance as UTF-8 JSON bytes"""
+    return _cached_json(('sales_rep_performance', start_date, end_date),
+                        lambda: _get_service().get_sales_rep_performance(start_date, end_date))
 
 def get_top_customers(limit: int = 10, start_date: Optional[str] = None, 
-                     end_date: Optional[str] = None) -> str:
-    """Get top customers as JSON string"""
-    service = DataQueryService()
-    data = service.get_top_customers(limit, start_date, end_date)
-    return json.dumps(data, default=str)
+                     end_date: Optional[str] = None) -> bytes:
+    """Get top customers as UTF-8 JSON bytes"""
+    return _cached_json(('top_customers', limit, start_date, end_date),
+                        lambda: _get_service().get_top_customers(limit, start_date, end_date))
+
+async def get_dashboard(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        limit: int = 10) -> bytes:
+    """Get regional sales, sales rep performance and top customers as one UTF-8 JSON document, querying them concurrently"""
+    # Served from the same TTL cache as the individual endpoints; the cached payloads are spliced, not re-serialized
+    regional_sales, sales_rep_performance, top_customers = await asyncio.gather(
+        asyncio.to_thread(get_regional_sales, start_date, end_date),
+        asyncio.to_thread(get_sales_rep_performance, start_date, end_date),
+        asyncio.to_thread(get_top_customers, limit, start_date, end_date)
+    )
+    return b''.join((
+        b'{"regional_sales":', regional_sales,
+        b',"sales_rep_performance":', sales_rep_performance,
+        b',"top_customers":', top_customers, b'}'
+    ))
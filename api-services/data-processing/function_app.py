@@ -1,3 +1,5 @@
+import asyncio
+import gzip
 import logging
 import azure.functions as func
 from .process_sap_data import process_sap_data
@@ -6,6 +8,26 @@ from .generate_insights import generate_insights
 
 app = func.FunctionApp()
 
+# Payloads smaller than this are sent uncompressed; gzip overhead outweighs the savings
+GZIP_MIN_SIZE = 1024
+GZIP_COMPRESS_LEVEL = 5
+
+def _json_response(req: func.HttpRequest, body: bytes, status_code: int = 200) -> func.HttpResponse:
+    """Build a JSON response from UTF-8 JSON bytes, gzip-compressed when the client accepts it"""
+    headers = {"Vary": "Accept-Encoding"}
+    
+    accept_encoding = req.headers.get('Accept-Encoding', '')
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in accept_encoding.lower():
+        body = gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    
+    return func.HttpResponse(
+        body=body,
+        headers=headers,
+        mimetype="application/json",
+        status_code=status_code
+    )
+
 @app.function_name(name="ProcessSapData")
 @app.timer_trigger(schedule="0 0 2 * * *", arg_name="myTimer", run_on_startup=False,
               use_monitor=False)
@@ -27,7 +49,7 @@ def process_sap_data_timer(myTimer: func.TimerRequest) -> None:
 @app.function_name(name="UpdateAISearch")
 @app.timer_trigger(schedule="0 30 2 * * *", arg_name="myTimer", run_on_startup=False,
               use_monitor=False)
-def update_ai_search_timer(myTimer: func.TimerRequest) -> None:
+async def update_ai_search_timer(myTimer: func.TimerRequest) -> None:
     """
     Timer-triggered function to update AI Search index after data processing
     """
@@ -36,7 +58,7 @@ def update_ai_search_timer(myTimer: func.TimerRequest) -> None:
     
     logging.info('Starting AI Search index update...')
     try:
-        result = update_ai_search()
+        result = await update_ai_search()
         logging.info(f'AI Search index update completed: {result}')
     except Exception as e:
         logging.error(f'Error updating AI Search: {str(e)}')
@@ -45,7 +67,7 @@ def update_ai_search_timer(myTimer: func.TimerRequest) -> None:
 @app.function_name(name="GenerateInsights")
 @app.timer_trigger(schedule="0 0 3 * * *", arg_name="myTimer", run_on_startup=False,
               use_monitor=False)
-def generate_insights_timer(myTimer: func.TimerRequest) -> None:
+async def generate_insights_timer(myTimer: func.TimerRequest) -> None:
     """
     Timer-triggered function to generate business insights
     """
@@ -54,7 +76,7 @@ def generate_insights_timer(myTimer: func.TimerRequest) -> None:
     
     logging.info('Starting insights generation...')
     try:
-        result = generate_insights()
+        result = await generate_insights()
         logging.info(f'Insights generation completed: {result}')
     except Exception as e:
         logging.error(f'Error generating insights: {str(e)}')
@@ -83,7 +105,7 @@ def process_sap_data_http(req: func.HttpRequest) -> func.HttpResponse:
 
 @app.function_name(name="GetCustomerData")
 @app.route(route="customers/{customer_id}", methods=["GET"])
-def get_customer_data(req: func.HttpRequest) -> func.HttpResponse:
+async def get_customer_data(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP function to get customer data
     """
@@ -97,16 +119,13 @@ def get_customer_data(req: func.HttpRequest) -> func.HttpResponse:
     
     try:
         # Import here to avoid circular imports
-        from .data_queries import get_customer_data as query_customer_data
+        from .data_queries import get_customer_json as query_customer_data
         
-        customer_data = query_customer_data(customer_id)
+        # pyodbc blocks on I/O, so run the query on a worker thread and keep the event loop free
+        customer_data = await asyncio.to_thread(query_customer_data, customer_id)
         
         if customer_data:
-            return func.HttpResponse(
-                customer_data,
-                mimetype="application/json",
-                status_code=200
-            )
+            return _json_response(req, customer_data)
         else:
             return func.HttpResponse(
                 "Customer not found",
@@ -119,9 +138,51 @@ def get_customer_data(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
+@app.function_name(name="GetCustomerProfile")
+@app.route(route="customers/{customer_id}/profile", methods=["GET"])
+async def get_customer_profile(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    HTTP function to get customer data together with recent orders
+    """
+    customer_id = req.route_params.get('customer_id')
+    
+    if not customer_id:
+        return func.HttpResponse(
+            "Customer ID is required",
+            status_code=400
+        )
+    
+    try:
+        limit = int(req.params.get('limit', 50))
+    except ValueError:
+        return func.HttpResponse(
+            "Limit must be an integer",
+            status_code=400
+        )
+    
+    try:
+        # Import here to avoid circular imports
+        from .data_queries import get_customer_profile as query_customer_profile
+        
+        profile_data = await asyncio.to_thread(query_customer_profile, customer_id, limit)
+        
+        if profile_data:
+            return _json_response(req, profile_data)
+        else:
+            return func.HttpResponse(
+                "Customer not found",
+                status_code=404
+            )
+    except Exception as e:
+        logging.error(f'Error getting customer profile: {str(e)}')
+        return func.HttpResponse(
+            f"Error getting customer profile: {str(e)}",
+            status_code=500
+        )
+
 @app.function_name(name="GetSalesData")
 @app.route(route="sales", methods=["GET"])
-def get_sales_data(req: func.HttpRequest) -> func.HttpResponse:
+async def get_sales_data(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP function to get sales data with filters
     """
@@ -135,21 +196,50 @@ def get_sales_data(req: func.HttpRequest) -> func.HttpResponse:
         region = req.params.get('region')
         customer_id = req.params.get('customer_id')
         
-        sales_data = query_sales_data(
+        sales_data = await asyncio.to_thread(
+            query_sales_data,
             start_date=start_date,
             end_date=end_date,
             region=region,
             customer_id=customer_id
         )
         
-        return func.HttpResponse(
-            sales_data,
-            mimetype="application/json",
-            status_code=200
-        )
+        return _json_response(req, sales_data)
     except Exception as e:
         logging.error(f'Error getting sales data: {str(e)}')
         return func.HttpResponse(
             f"Error getting sales data: {str(e)}",
             status_code=500
         )
+
+@app.function_name(name="GetDashboard")
+@app.route(route="dashboard", methods=["GET"])
+async def get_dashboard(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    HTTP function to get the dashboard aggregates in a single request
+    """
+    try:
+        limit = int(req.params.get('limit', 10))
+    except ValueError:
+        return func.HttpResponse(
+            "Limit must be an integer",
+            status_code=400
+        )
+    
+    try:
+        # Import here to avoid circular imports
+        from .data_queries import get_dashboard as query_dashboard
+        
+        dashboard_data = await query_dashboard(
+            start_date=req.params.get('start_date'),
+            end_date=req.params.get('end_date'),
+            limit=limit
+        )
+        
+        return _json_response(req, dashboard_data)
+    except Exception as e:
+        logging.error(f'Error getting dashboard data: {str(e)}')
+        return func.HttpResponse(
+            f"Error getting dashboard data: {str(e)}",
+            status_code=500
+        )
@@ -3,20 +3,125 @@ Business Insights Generation Module
 Generates business insights from processed SAP data
 """
 
+import asyncio
+import json
 import logging
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import pyodbc
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 import os
+import time
+from contextlib import closing
+from .sql_frames import frame_from_cursor
+from .sql_pool import get_conn
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How long a connection string fetched from Key Vault is reused before it is read again (secret rotation)
+SECRET_CACHE_SECONDS = float(os.environ.get('SECRET_CACHE_SECONDS', '3600'))
+
+# Rows pulled from the driver per fetchmany() call while reading the aggregates
+FETCH_BATCH_SIZE = int(os.environ.get('INSIGHTS_FETCH_BATCH_SIZE', '5000'))
+
+# Per-dimension aggregates of the Sales table over the last ? days, computed in one scan of the window with
+# GROUPING SETS; each output row is labelled with the insight dimension it belongs to. Grouping keys that
+# pandas would drop (NULL Region/SalesRep) are filtered out, and customer/product attributes are joined onto
+# the aggregated rows once per key rather than once per sales row.
+AGGREGATE_QUERY = """
+    WITH WindowSales AS (
+        SELECT 
+            CAST(s.SalesDate AS date) as SalesDay,
+            s.CustomerID,
+            s.ProductCode,
+            s.Region,
+            s.SalesRep,
+            s.SalesDate,
+            s.SalesAmount,
+            s.SalesQuantity,
+            s.UnitPrice
+        FROM Sales s
+        WHERE s.IsActive = 1 AND s.SalesDate >= DATEADD(day, -?, GETUTCDATE())
+    ),
+    Grouped AS (
+        SELECT 
+            CASE 
+                WHEN GROUPING(w.SalesDay) = 0 THEN 'daily'
+                WHEN GROUPING(w.CustomerID) = 0 THEN 'customers'
+                WHEN GROUPING(w.ProductCode) = 0 THEN 'products'
+                WHEN GROUPING(w.Region) = 0 THEN 'regions'
+                ELSE 'sales_reps'
+            END as Dimension,
+            w.SalesDay,
+            w.CustomerID,
+            w.ProductCode,
+            w.Region,
+            w.SalesRep,
+            SUM(w.SalesAmount) as TotalSales,
+            COUNT(*) as OrderCount,
+            AVG(w.SalesAmount) as AvgOrderValue,
+            SUM(w.SalesQuantity) as TotalQuantity,
+            AVG(w.UnitPrice) as AvgUnitPrice,
+            MAX(w.SalesDate) as LastOrder,
+            COUNT(DISTINCT w.CustomerID) as UniqueCustomers,
+            COUNT(DISTINCT w.SalesRep) as SalesReps,
+            COUNT(DISTINCT w.Region) as Regions
+        FROM WindowSales w
+        GROUP BY GROUPING SETS ((w.SalesDay), (w.CustomerID), (w.ProductCode), (w.Region), (w.SalesRep))
+    )
+    SELECT 
+        g.*,
+        c.CustomerSegment as Segment,
+        c.Region as CustomerRegion,
+        p.ProductCategory as Category
+    FROM Grouped g
+    LEFT JOIN Customers c ON g.Dimension = 'customers' AND g.CustomerID = c.CustomerID
+    LEFT JOIN Products p ON g.Dimension = 'products' AND g.ProductCode = p.ProductCode
+    WHERE NOT (g.Dimension = 'regions' AND g.Region IS NULL)
+      AND NOT (g.Dimension = 'sales_reps' AND g.SalesRep IS NULL)
+    ORDER BY g.Dimension, g.SalesDay, g.TotalSales DESC
+"""
+
+# Columns each insight reads from the fused result set, mapped to their names in that insight's frame.
+# Daily rows come back in date order, all other dimensions by TotalSales descending.
+DIMENSION_COLUMNS = {
+    "daily": {'SalesDay': 'Date', 'TotalSales': 'TotalSales', 'UniqueCustomers': 'UniqueCustomers', 'OrderCount': 'OrderCount'},
+    "customers": {'CustomerID': 'CustomerID', 'TotalSales': 'TotalSales', 'OrderCount': 'OrderCount', 'AvgOrderValue': 'AvgOrderValue',
+                  'LastOrder': 'LastOrder', 'Segment': 'Segment', 'CustomerRegion': 'Region'},
+    "products": {'ProductCode': 'ProductCode', 'TotalSales': 'TotalSales', 'TotalQuantity': 'TotalQuantity',
+                 'AvgUnitPrice': 'AvgUnitPrice', 'Category': 'Category'},
+    "regions": {'Region': 'Region', 'TotalSales': 'TotalSales', 'OrderCount': 'OrderCount', 'UniqueCustomers': 'UniqueCustomers',
+                'SalesReps': 'SalesReps'},
+    "sales_reps": {'SalesRep': 'SalesRep', 'TotalSales': 'TotalSales', 'OrderCount': 'OrderCount', 'UniqueCustomers': 'UniqueCustomers',
+                   'Regions': 'Regions'}
+}
+
+# Aggregate measures every insight works on as float64 arrays (empty result sets would otherwise be object dtype)
+_FLOAT_COLUMNS = ('TotalSales', 'TotalQuantity', 'AvgOrderValue', 'AvgUnitPrice')
+
+# Low-cardinality attributes the insights group by; as categoricals the groupby hashes integer codes
+_CATEGORY_COLUMNS = ('Segment', 'Category')
+
+def _prepare_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Cast the measure columns of a freshly fetched frame to float64 and its grouping attributes to category, in place"""
+    for column in _FLOAT_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype(np.float64)
+    for column in _CATEGORY_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype('category')
+    return frame
+
+def _records(frame: pd.DataFrame, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Output records for the selected columns, rounding floats to 2 decimals only at this point"""
+    if columns is not None:
+        frame = frame[columns]
+    return frame.round(2).to_dict('records')
+
 class InsightsGenerator:
     def __init__(self):
         self.credential = DefaultAzureCredential()
@@ -30,76 +135,61 @@ class InsightsGenerator:
             )
         else:
             self.secret_client = None
+        
+        self._cached_conn_str: Optional[str] = None
+        self._cached_conn_str_at = 0.0
+        self._table_checked = False
 
     def get_sql_connection_string(self) -> str:
-        """Get SQL connection string from environment or Key Vault"""
+        """Get SQL connection string from environment or Key Vault, caching the Key Vault value for SECRET_CACHE_SECONDS"""
         try:
             if self.sql_connection_string:
                 return self.sql_connection_string
             
+            if self._cached_conn_str and time.monotonic() - self._cached_conn_str_at < SECRET_CACHE_SECONDS:
+                return self._cached_conn_str
+            
             if self.secret_client:
                 secret = self.secret_client.get_secret("sql-connection-string")
-                return secret.value
+                self._cached_conn_str = secret.value
+                self._cached_conn_str_at = time.monotonic()
+                return self._cached_conn_str
             
             raise ValueError("No SQL connection string available")
         except Exception as e:
             logger.error(f"Error getting SQL connection string: {str(e)}")
             raise
 
-    def get_sales_data(self, days: int = 30) -> pd.DataFrame:
-        """Get sales data for the specified number of days"""
+    def get_sales_data_aggregated(self, days: int = 30) -> Dict[str, pd.DataFrame]:
+        """Get the per-dimension sales aggregates for the specified number of days, computed by SQL Server"""
         try:
             connection_string = self.get_sql_connection_string()
-            query = f"""
-                SELECT 
-                    s.CustomerID,
-                    s.ProductCode,
-                    s.SalesDate,
-                    s.SalesAmount,
-                    s.SalesQuantity,
-                    s.UnitPrice,
-                    s.Region,
-                    s.Channel,
-                    s.SalesRep,
-                    s.DataSource,
-                    c.CustomerSegment,
-                    p.ProductCategory
-                FROM Sales s
-                LEFT JOIN Customers c ON s.CustomerID = c.CustomerID
-                LEFT JOIN Products p ON s.ProductCode = p.ProductCode
-                WHERE s.IsActive = 1
-                AND s.SalesDate >= DATEADD(day, -{days}, GETUTCDATE())
-                ORDER BY s.SalesDate DESC
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn)
-            
-            logger.info(f"Retrieved {len(df)} sales records for insights generation")
-            return df
+            aggregates = {}
+            
+            # Pooled connections already read DECIMAL/NUMERIC columns as float
+            with get_conn(connection_string) as conn, closing(conn.cursor()) as cursor:
+                cursor.execute(AGGREGATE_QUERY, days)
+                fused = _prepare_frame(frame_from_cursor(cursor, FETCH_BATCH_SIZE))
+            
+            # Split the fused result set into one frame per insight dimension
+            dimensions = dict(tuple(fused.groupby('Dimension', sort=False)))
+            for name, columns in DIMENSION_COLUMNS.items():
+                frame = dimensions.get(name, fused.iloc[0:0])
+                aggregates[name] = frame[list(columns)].rename(columns=columns).reset_index(drop=True)
+            
+            logger.info(f"Retrieved {len(aggregates['daily'])} days of sales aggregates for insights generation")
+            return aggregates
             
         except Exception as e:
-            logger.error(f"Error getting sales data: {str(e)}")
-            return pd.DataFrame()
+            logger.error(f"Error getting aggregated sales data: {str(e)}")
+            return {name: pd.DataFrame() for name in DIMENSION_COLUMNS}
 
-    def generate_sales_trends(self, sales_data: pd.DataFrame) -> Dict[str, Any]:
+    def generate_sales_trends(self, daily_sales: pd.DataFrame) -> Dict[str, Any]:
         """Generate sales trend insights"""
         try:
-            if sales_data.empty:
+            if daily_sales.empty:
                 return {"error": "No sales data available"}
             
-            # Convert SalesDate to datetime
-            sales_data['SalesDate'] = pd.to_datetime(sales_data['SalesDate'])
-            
-            # Daily sales trends
-            daily_sales = sales_data.groupby(sales_data['SalesDate'].dt.date).agg({
-                'SalesAmount': 'sum',
-                'SalesQuantity': 'sum',
-                'CustomerID': 'nunique'
-            }).reset_index()
-            
-            daily_sales.columns = ['Date', 'TotalSales', 'TotalQuantity', 'UniqueCustomers']
-            
             # Calculate trends
             total_sales = daily_sales['TotalSales'].sum()
             avg_daily_sales = daily_sales['TotalSales'].mean()
@@ -121,91 +211,72 @@ class InsightsGenerator:
             logger.error(f"Error generating sales trends: {str(e)}")
             return {"error": str(e)}
 
-    def generate_customer_insights(self, sales_data: pd.DataFrame) -> Dict[str, Any]:
+    def generate_customer_insights(self, customer_sales: pd.DataFrame) -> Dict[str, Any]:
         """Generate customer insights"""
         try:
-            if sales_data.empty:
+            if customer_sales.empty:
                 return {"error": "No sales data available"}
             
-            # Customer analysis
-            customer_analysis = sales_data.groupby('CustomerID').agg({
-                'SalesAmount': ['sum', 'count', 'mean'],
-                'SalesQuantity': 'sum',
-                'SalesDate': ['min', 'max'],
-                'CustomerSegment': 'first',
-                'Region': 'first'
-            }).round(2)
-            
-            customer_analysis.columns = ['TotalSales', 'OrderCount', 'AvgOrderValue', 'TotalQuantity', 'FirstOrder', 'LastOrder', 'Segment', 'Region']
-            customer_analysis = customer_analysis.reset_index()
+            # Customer analysis (rows arrive ordered by TotalSales descending)
+            customer_analysis = customer_sales
             
             # Top customers
-            top_customers = customer_analysis.nlargest(10, 'TotalSales')[['CustomerID', 'TotalSales', 'OrderCount', 'AvgOrderValue', 'Segment', 'Region']].to_dict('records')
+            top_customers = _records(customer_analysis.head(10), ['CustomerID', 'TotalSales', 'OrderCount', 'AvgOrderValue', 'Segment', 'Region'])
             
             # Customer segments analysis
-            segment_analysis = customer_analysis.groupby('Segment').agg({
-                'CustomerID': 'count',
-                'TotalSales': 'sum',
-                'AvgOrderValue': 'mean'
-            }).round(2)
-            segment_analysis.columns = ['CustomerCount', 'TotalSales', 'AvgOrderValue']
-            segment_analysis = segment_analysis.reset_index()
+            segment_analysis = customer_analysis.groupby('Segment', observed=True).agg(
+                CustomerCount=('CustomerID', 'count'),
+                TotalSales=('TotalSales', 'sum'),
+                AvgOrderValue=('AvgOrderValue', 'mean')
+            ).reset_index()
             
             # Customer retention analysis
-            recent_customers = customer_analysis[customer_analysis['LastOrder'] >= (datetime.now() - timedelta(days=7)).date()]
-            returning_customers = customer_analysis[customer_analysis['OrderCount'] > 1]
+            recent_cutoff = np.datetime64((datetime.now() - timedelta(days=7)).date())
+            recent_customers = int((customer_analysis['LastOrder'].to_numpy() >= recent_cutoff).sum())
+            returning_customers = int((customer_analysis['OrderCount'].to_numpy() > 1).sum())
             
             return {
                 "total_customers": len(customer_analysis),
                 "top_customers": top_customers,
-                "segment_analysis": segment_analysis.to_dict('records'),
-                "recent_customers": len(recent_customers),
-                "returning_customers": len(returning_customers),
-                "customer_retention_rate": float(len(returning_customers) / len(customer_analysis) * 100) if len(customer_analysis) > 0 else 0
+                "segment_analysis": _records(segment_analysis),
+                "recent_customers": recent_customers,
+                "returning_customers": returning_customers,
+                "customer_retention_rate": float(returning_customers / len(customer_analysis) * 100) if len(customer_analysis) > 0 else 0
             }
             
         except Exception as e:
             logger.error(f"Error generating customer insights: {str(e)}")
             return {"error": str(e)}
 
-    def generate_product_insights(self, sales_data: pd.DataFrame) -> Dict[str, Any]:
+    def generate_product_insights(self, product_sales: pd.DataFrame) -> Dict[str, Any]:
         """Generate product performance insights"""
         try:
-            if sales_data.empty:
+            if product_sales.empty:
                 return {"error": "No sales data available"}
             
-            # Product analysis
-            product_analysis = sales_data.groupby('ProductCode').agg({
-                'SalesAmount': ['sum', 'count', 'mean'],
-                'SalesQuantity': 'sum',
-                'UnitPrice': 'mean',
-                'ProductCategory': 'first'
-            }).round(2)
-            
-            product_analysis.columns = ['TotalSales', 'OrderCount', 'AvgOrderValue', 'TotalQuantity', 'AvgUnitPrice', 'Category']
-            product_analysis = product_analysis.reset_index()
+            # Product analysis (rows arrive ordered by TotalSales descending)
+            product_analysis = product_sales
             
             # Top products
-            top_products = product_analysis.nlargest(10, 'TotalSales')[['ProductCode', 'TotalSales', 'TotalQuantity', 'AvgUnitPrice', 'Category']].to_dict('records')
+            top_products = _records(product_analysis.head(10), ['ProductCode', 'TotalSales', 'TotalQuantity', 'AvgUnitPrice', 'Category'])
             
             # Category analysis
-            category_analysis = product_analysis.groupby('Category').agg({
-                'ProductCode': 'count',
-                'TotalSales': 'sum',
-                'TotalQuantity': 'sum',
-                'AvgUnitPrice': 'mean'
-            }).round(2)
-            category_analysis.columns = ['ProductCount', 'TotalSales', 'TotalQuantity', 'AvgUnitPrice']
-            category_analysis = category_analysis.reset_index()
+            category_analysis = product_analysis.groupby('Category', observed=True).agg(
+                ProductCount=('ProductCode', 'count'),
+                TotalSales=('TotalSales', 'sum'),
+                TotalQuantity=('TotalQuantity', 'sum'),
+                AvgUnitPrice=('AvgUnitPrice', 'mean')
+            ).reset_index()
             
             # Product performance metrics
             total_products = len(product_analysis)
-            high_performing_products = len(product_analysis[product_analysis['TotalSales'] > product_analysis['TotalSales'].quantile(0.8)])
+            product_totals = product_analysis['TotalSales'].to_numpy()
+            high_performing_products = int((product_totals > np.quantile(product_totals, 0.8)).sum())
             
             return {
                 "total_products": total_products,
                 "top_products": top_products,
-                "category_analysis": category_analysis.to_dict('records'),
+                "category_analysis": _records(category_analysis),
                 "high_performing_products": high_performing_products,
                 "product_diversity_score": float(high_performing_products / total_products * 100) if total_products > 0 else 0
             }
@@ -214,84 +285,72 @@ class InsightsGenerator:
             logger.error(f"Error generating product insights: {str(e)}")
             return {"error": str(e)}
 
-    def generate_regional_insights(self, sales_data: pd.DataFrame) -> Dict[str, Any]:
+    def generate_regional_insights(self, regional_sales: pd.DataFrame) -> Dict[str, Any]:
         """Generate regional performance insights"""
         try:
-            if sales_data.empty:
+            if regional_sales.empty:
                 return {"error": "No sales data available"}
             
-            # Regional analysis
-            regional_analysis = sales_data.groupby('Region').agg({
-                'SalesAmount': ['sum', 'count', 'mean'],
-                'SalesQuantity': 'sum',
-                'CustomerID': 'nunique',
-                'SalesRep': 'nunique'
-            }).round(2)
-            
-            regional_analysis.columns = ['TotalSales', 'OrderCount', 'AvgOrderValue', 'TotalQuantity', 'UniqueCustomers', 'SalesReps']
-            regional_analysis = regional_analysis.reset_index()
+            # Regional analysis (rows arrive ordered by TotalSales descending)
+            regional_analysis = regional_sales
             
             # Top regions
-            top_regions = regional_analysis.nlargest(5, 'TotalSales')[['Region', 'TotalSales', 'OrderCount', 'UniqueCustomers', 'SalesReps']].to_dict('records')
+            top_regions = _records(regional_analysis.head(5), ['Region', 'TotalSales', 'OrderCount', 'UniqueCustomers', 'SalesReps'])
             
             # Regional performance metrics
             total_regions = len(regional_analysis)
             avg_sales_per_region = regional_analysis['TotalSales'].mean()
-            best_region = regional_analysis.loc[regional_analysis['TotalSales'].idxmax(), 'Region']
-            best_region_sales = regional_analysis['TotalSales'].max()
+            region_sales = regional_analysis['TotalSales'].to_numpy()
+            best_index = int(region_sales.argmax())
+            best_region = regional_analysis['Region'].iat[best_index]
+            best_region_sales = region_sales[best_index]
             
             return {
                 "total_regions": total_regions,
                 "top_regions": top_regions,
-                "average_sales_per_region": float(avg_sales_per_region),
+                "average_sales_per_region": round(float(avg_sales_per_region), 2),
                 "best_performing_region": best_region,
-                "best_region_sales": float(best_region_sales),
-                "regional_distribution": regional_analysis[['Region', 'TotalSales']].to_dict('records')
+                "best_region_sales": round(float(best_region_sales), 2),
+                "regional_distribution": [
+                    {'Region': region, 'TotalSales': round(float(sales), 2)}
+                    for region, sales in zip(regional_analysis['Region'].to_numpy(), region_sales)
+                ]
             }
             
         except Exception as e:
             logger.error(f"Error generating regional insights: {str(e)}")
             return {"error": str(e)}
 
-    def generate_sales_rep_insights(self, sales_data: pd.DataFrame) -> Dict[str, Any]:
+    def generate_sales_rep_insights(self, rep_sales: pd.DataFrame) -> Dict[str, Any]:
         """Generate sales rep performance insights"""
         try:
-            if sales_data.empty:
-                return {"error": "No sales data available"}
-            
-            # Filter out records without sales rep
-            sales_with_rep = sales_data[sales_data['SalesRep'].notna()]
-            
-            if sales_with_rep.empty:
+            if rep_sales.empty:
                 return {"error": "No sales rep data available"}
             
-            # Sales rep analysis
-            rep_analysis = sales_with_rep.groupby('SalesRep').agg({
-                'SalesAmount': ['sum', 'count', 'mean'],
-                'SalesQuantity': 'sum',
-                'CustomerID': 'nunique',
-                'Region': 'nunique'
-            }).round(2)
-            
-            rep_analysis.columns = ['TotalSales', 'OrderCount', 'AvgOrderValue', 'TotalQuantity', 'UniqueCustomers', 'Regions']
-            rep_analysis = rep_analysis.reset_index()
+            # Sales rep analysis (rows arrive ordered by TotalSales descending)
+            rep_analysis = rep_sales
             
             # Top sales reps
-            top_reps = rep_analysis.nlargest(5, 'TotalSales')[['SalesRep', 'TotalSales', 'OrderCount', 'UniqueCustomers', 'Regions']].to_dict('records')
+            top_reps = _records(rep_analysis.head(5), ['SalesRep', 'TotalSales', 'OrderCount', 'UniqueCustomers', 'Regions'])
             
             # Performance metrics
             total_reps = len(rep_analysis)
             avg_sales_per_rep = rep_analysis['TotalSales'].mean()
-            top_rep = rep_analysis.loc[rep_analysis['TotalSales'].idxmax(), 'SalesRep']
-            top_rep_sales = rep_analysis['TotalSales'].max()
+            rep_totals = rep_analysis['TotalSales'].to_numpy()
+            top_index = int(rep_totals.argmax())
+            top_rep = rep_analysis['SalesRep'].iat[top_index]
+            top_rep_sales = rep_totals[top_index]
             
             return {
                 "total_sales_reps": total_reps,
                 "top_sales_reps": top_reps,
-                "average_sales_per_rep": float(avg_sales_per_rep),
+                "average_sales_per_rep": round(float(avg_sales_per_rep), 2),
                 "top_performing_rep": top_rep,
-                "top_rep_sales": float(top_rep_sales),
-                "rep_performance_distribution": rep_analysis[['SalesRep', 'TotalSales']].to_dict('records')
+                "top_rep_sales": round(float(top_rep_sales), 2),
+                "rep_performance_distribution": [
+                    {'SalesRep': rep, 'TotalSales': round(float(sales), 2)}
+                    for rep, sales in zip(rep_analysis['SalesRep'].to_numpy(), rep_totals)
+                ]
             }
             
         except Exception as e:
@@ -304,8 +363,11 @@ class InsightsGenerator:
             if len(values) < 2:
                 return 0.0
             
-            first_half = values[:len(values)//2].mean()
-            second_half = values[len(values)//2:].mean()
+            # Reduce each half of the underlying float64 buffer through array views; no temporary Series
+            array = values.to_numpy(dtype=np.float64)
+            half = len(array) // 2
+            first_half = array[:half].sum() / half
+            second_half = array[half:].sum() / (len(array) - half)
             
             if first_half == 0:
                 return 0.0
@@ -315,32 +377,38 @@ class InsightsGenerator:
             logger.error(f"Error calculating growth rate: {str(e)}")
             return 0.0
 
+    def ensure_insights_table(self) -> None:
+        """Create the insights table if it doesn't exist; checked once per generator (create-tables.sql also creates it)"""
+        if self._table_checked:
+            return
+        
+        connection_string = self.get_sql_connection_string()
+        
+        with get_conn(connection_string) as conn:
+            conn.cursor().execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='BusinessInsights' AND xtype='U')
+                CREATE TABLE BusinessInsights (
+                    Id uniqueidentifier PRIMARY KEY DEFAULT NEWID(),
+                    InsightType nvarchar(100) NOT NULL,
+                    InsightData nvarchar(max) NOT NULL,
+                    GeneratedDate datetime2 NOT NULL DEFAULT GETUTCDATE(),
+                    IsActive bit NOT NULL DEFAULT 1
+                )
+            """)
+        self._table_checked = True
+
     def save_insights(self, insights: Dict[str, Any]) -> bool:
-        """Save insights to database"""
+        """Save insights to database (the table must exist, see ensure_insights_table)"""
         try:
             connection_string = self.get_sql_connection_string()
             
-            with pyodbc.connect(connection_string) as conn:
-                cursor = conn.cursor()
-                
-                # Create insights table if it doesn't exist
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='BusinessInsights' AND xtype='U')
-                    CREATE TABLE BusinessInsights (
-                        Id uniqueidentifier PRIMARY KEY DEFAULT NEWID(),
-                        InsightType nvarchar(100) NOT NULL,
-                        InsightData nvarchar(max) NOT NULL,
-                        GeneratedDate datetime2 NOT NULL DEFAULT GETUTCDATE(),
-                        IsActive bit NOT NULL DEFAULT 1
-                    )
-                """)
-                
-                # Insert insights
-                for insight_type, insight_data in insights.items():
-                    cursor.execute("""
-                        INSERT INTO BusinessInsights (InsightType, InsightData)
-                        VALUES (?, ?)
-                    """, insight_type, str(insight_data))
+            with get_conn(connection_string, autocommit=False) as conn, closing(conn.cursor()) as cursor:
+                # Insert insights in one batch, stored as JSON so they can be parsed back
+                cursor.fast_executemany = True
+                cursor.executemany("""
+                    INSERT INTO BusinessInsights (InsightType, InsightData)
+                    VALUES (?, ?)
+                """, [(insight_type, json.dumps(insight_data, default=str)) for insight_type, insight_data in insights.items()])
                 
                 conn.commit()
                 logger.info("Successfully saved insights to database")
@@ -350,29 +418,37 @@ class InsightsGenerator:
             logger.error(f"Error saving insights: {str(e)}")
             return False
 
-    def generate_all_insights(self) -> str:
+    def compute_all_insights(self, aggregates: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+        """Derive every insight type from the per-dimension aggregates"""
+        return {
+            "sales_trends": self.generate_sales_trends(aggregates['daily']),
+            "customer_insights": self.generate_customer_insights(aggregates['customers']),
+            "product_insights": self.generate_product_insights(aggregates['products']),
+            "regional_insights": self.generate_regional_insights(aggregates['regions']),
+            "sales_rep_insights": self.generate_sales_rep_insights(aggregates['sales_reps'])
+        }
+
+    async def generate_all_insights(self) -> str:
         """Generate all business insights"""
         try:
             logger.info("Starting insights generation...")
             
-            # Get sales data for the last 30 days
-            sales_data = self.get_sales_data(30)
+            # Get sales aggregates for the last 30 days while the insights table check runs on another connection
+            table_task = asyncio.create_task(asyncio.to_thread(self.ensure_insights_table))
+            aggregates = await asyncio.to_thread(self.get_sales_data_aggregated, 30)
+            daily_sales = aggregates['daily']
             
-            if sales_data.empty:
+            if daily_sales.empty:
+                await table_task
                 return "No sales data available for insights generation"
             
             # Generate insights
-            insights = {
-                "sales_trends": self.generate_sales_trends(sales_data),
-                "customer_insights": self.generate_customer_insights(sales_data),
-                "product_insights": self.generate_product_insights(sales_data),
-                "regional_insights": self.generate_regional_insights(sales_data),
-                "sales_rep_insights": self.generate_sales_rep_insights(sales_data)
-            }
+            insights = await asyncio.to_thread(self.compute_all_insights, aggregates)
+            await table_task
             
             # Save insights
-            if self.save_insights(insights):
-                return f"Successfully generated and saved insights for {len(sales_data)} sales records"
+            if await asyncio.to_thread(self.save_insights, insights):
+                return f"Successfully generated and saved insights for {int(daily_sales['OrderCount'].sum())} sales records"
             else:
                 return "Generated insights but failed to save to database"
                 
@@ -380,7 +456,12 @@ class InsightsGenerator:
             logger.error(f"Error generating insights: {str(e)}")
             return f"Error generating insights: {str(e)}"
 
-def generate_insights() -> str:
+# Reused across timer invocations so the credential and cached connection string stay warm
+_GENERATOR: Optional[InsightsGenerator] = None
+
+async def generate_insights() -> str:
     """Azure Function entry point for generating insights"""
-    generator = InsightsGenerator()
-    return generator.generate_all_insights()
+    global _GENERATOR
+    if _GENERATOR is None:
+        _GENERATOR = InsightsGenerator()
+    return await _GENERATOR.generate_all_insights()
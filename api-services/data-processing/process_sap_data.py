@@ -6,17 +6,65 @@ Processes raw SAP data and creates aggregated insights
 import logging
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Iterator, List, Optional, Tuple
 import pyodbc
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .sql_frames import frame_from_cursor
+from .sql_pool import add_decimal_converters
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows pulled from the driver per fetchmany() call when reading raw SAP data
+FETCH_BATCH_SIZE = int(os.environ.get('SAP_FETCH_BATCH_SIZE', '50000'))
+
+# ODBC connection attribute for the TDS packet size (not exported by pyodbc); larger packets cut round-trips on bulk transfers
+SQL_ATTR_PACKET_SIZE = 112
+PACKET_SIZE = int(os.environ.get('SQL_PACKET_SIZE', '32767'))
+
+# Rows sent per executemany call when saving processed data
+SAVE_BATCH_SIZE = int(os.environ.get('SQL_SAVE_BATCH_SIZE', '10000'))
+
+@contextmanager
+def _connect(connection_string: str, autocommit: bool = False) -> Iterator[pyodbc.Connection]:
+    """Open a connection tuned for bulk transfers and close it when the with block exits"""
+    conn = pyodbc.connect(connection_string, autocommit=autocommit,
+                          attrs_before={SQL_ATTR_PACKET_SIZE: PACKET_SIZE})
+    try:
+        add_decimal_converters(conn)
+        yield conn
+    finally:
+        conn.close()
+
+def _read_frame(conn: pyodbc.Connection, query: str) -> pd.DataFrame:
+    """Run a query and build its DataFrame from fetchmany batches"""
+    cursor = conn.cursor()
+    cursor.execute(query)
+    return frame_from_cursor(cursor, FETCH_BATCH_SIZE)
+
+# Fixed parameter bindings (SQL type, column size, decimal digits) for the save statements, so pyodbc binds
+# every batch with the same C types instead of inferring them from the data
+_NVARCHAR_50 = (pyodbc.SQL_WVARCHAR, 50, 0)
+_NVARCHAR_100 = (pyodbc.SQL_WVARCHAR, 100, 0)
+_INTEGER = (pyodbc.SQL_INTEGER, 0, 0)
+_FLOAT = (pyodbc.SQL_DOUBLE, 0, 0)
+_DATETIME2 = (pyodbc.SQL_TYPE_TIMESTAMP, 27, 7)
+
+def _parameter_batches(df: pd.DataFrame, columns: List[str], batch_size: int = SAVE_BATCH_SIZE) -> Iterator[List[Tuple]]:
+    """Yield batches of parameter tuples in SQL column order, binding missing columns and NaN/NaT as NULL"""
+    frame = df.reindex(columns=columns)
+    for start in range(0, len(frame), batch_size):
+        # object dtype turns numpy scalars into the native Python values pyodbc binds
+        batch = frame.iloc[start:start + batch_size].astype(object)
+        batch = batch.where(batch.notna(), None)
+        yield list(batch.itertuples(index=False, name=None))
+
 class SapDataProcessor:
     def __init__(self):
         self.credential = DefaultAzureCredential()
@@ -31,23 +79,28 @@ class SapDataProcessor:
             )
         else:
             self.secret_client = None
+        
+        # The raw-data fetches run concurrently, so the Key Vault lookup is guarded to happen once
+        self._cached_secret: Optional[str] = None
+        self._secret_lock = threading.Lock()
 
     def get_connection_string(self, use_processed_db: bool = False) -> str:
-        """Get SQL connection string from environment or Key Vault"""
+        """Get SQL connection string from environment or Key Vault, caching the Key Vault value"""
         if use_processed_db and self.processed_sql_connection_string:
             return self.processed_sql_connection_string
         elif self.sql_connection_string:
             return self.sql_connection_string
         elif self.secret_client:
-            secret = self.secret_client.get_secret("sql-connection-string")
-            return secret.value
+            with self._secret_lock:
+                if self._cached_secret is None:
+                    self._cached_secret = self.secret_client.get_secret("sql-connection-string").value
+                return self._cached_secret
         else:
             raise ValueError("No SQL connection string available")
 
     def get_raw_sap_ecc_data(self) -> pd.DataFrame:
         """Retrieve raw SAP ECC data from database"""
         try:
-            connection_string = self.get_connection_string(use_processed_db=False)
             query = """
                 SELECT 
                     CustomerID,
@@ -57,19 +110,15 @@ class SapDataProcessor:
                     Quantity,
                     UnitPrice,
                     TotalAmount,
-                    Status,
                     SalesRep,
-                    Region,
-                    ProcessedDate
+                    Region
                 FROM SapEccRawData 
                 WHERE IsActive = 1 
                 AND IsDeleted = 0
                 AND ProcessedDate >= DATEADD(day, -7, GETUTCDATE())
-                ORDER BY ProcessedDate DESC
             """
             
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn)
+            df = self._read_raw_db(query)
             
             logger.info(f"Retrieved {len(df)} SAP ECC records")
             return df
@@ -81,7 +130,6 @@ class SapDataProcessor:
     def get_raw_sap_bw_data(self) -> pd.DataFrame:
         """Retrieve raw SAP BW data from database"""
         try:
-            connection_string = self.get_connection_string(use_processed_db=False)
             query = """
                 SELECT 
                     CustomerID,
@@ -91,19 +139,14 @@ class SapDataProcessor:
                     SalesDate,
                     SalesRep,
                     Region,
-                    Channel,
-                    ProductCategory,
-                    CustomerSegment,
-                    ProcessedDate
+                    Channel
                 FROM SapBwRawData 
                 WHERE IsActive = 1 
                 AND IsDeleted = 0
                 AND ProcessedDate >= DATEADD(day, -7, GETUTCDATE())
-                ORDER BY ProcessedDate DESC
             """
             
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn)
+            df = self._read_raw_db(query)
             
             logger.info(f"Retrieved {len(df)} SAP BW records")
             return df
@@ -112,48 +155,131 @@ class SapDataProcessor:
             logger.error(f"Error retrieving SAP BW data: {str(e)}")
             raise
 
-    def process_customer_data(self, ecc_data: pd.DataFrame, bw_data: pd.DataFrame) -> pd.DataFrame:
-        """Process and aggregate customer data"""
+    def _read_raw_db(self, query: str) -> pd.DataFrame:
+        """Run a query against the raw SAP database"""
+        connection_string = self.get_connection_string(use_processed_db=False)
+        # Reads run in autocommit so no transaction is held open while rows stream
+        with _connect(connection_string, autocommit=True) as conn:
+            return _read_frame(conn, query)
+
+    def get_customer_agg_ecc(self) -> pd.DataFrame:
+        """Retrieve per-customer SAP ECC totals, aggregated by the database"""
         try:
-            # Combine customer data from both sources
-            customer_data = []
+            df = self._read_raw_db("""
+                SELECT 
+                    CustomerID,
+                    COUNT(OrderNumber) AS TotalOrders,
+                    SUM(TotalAmount) AS TotalSalesAmount,
+                    MAX(OrderDate) AS LastOrderDate,
+                    MAX(Region) AS Region,
+                    MAX(SalesRep) AS SalesRep,
+                    CAST(NULL AS nvarchar(100)) AS CustomerSegment,
+                    'SAP_ECC' AS DataSource
+                FROM SapEccRawData 
+                WHERE IsActive = 1 
+                AND IsDeleted = 0
+                AND ProcessedDate >= DATEADD(day, -7, GETUTCDATE())
+                GROUP BY CustomerID
+            """)
+            logger.info(f"Retrieved {len(df)} SAP ECC customer aggregates")
+            return df
             
-            # Process ECC data
-            if not ecc_data.empty:
-                ecc_customers = ecc_data.groupby('CustomerID').agg({
-                    'OrderNumber': 'count',
-                    'TotalAmount': 'sum',
-                    'OrderDate': 'max',
-                    'Region': 'first',
-                    'SalesRep': 'first'
-                }).reset_index()
-                
-                ecc_customers.columns = ['CustomerID', 'TotalOrders', 'TotalSalesAmount', 'LastOrderDate', 'Region', 'SalesRep']
-                ecc_customers['DataSource'] = 'SAP_ECC'
-                customer_data.append(ecc_customers)
+        except Exception as e:
+            logger.error(f"Error retrieving SAP ECC customer aggregates: {str(e)}")
+            raise
+
+    def get_customer_agg_bw(self) -> pd.DataFrame:
+        """Retrieve per-customer SAP BW totals, aggregated by the database"""
+        try:
+            df = self._read_raw_db("""
+                SELECT 
+                    CustomerID,
+                    0 AS TotalOrders,  -- BW doesn't have order count
+                    SUM(SalesAmount) AS TotalSalesAmount,
+                    MAX(SalesDate) AS LastOrderDate,
+                    MAX(Region) AS Region,
+                    MAX(SalesRep) AS SalesRep,
+                    MAX(CustomerSegment) AS CustomerSegment,
+                    'SAP_BW' AS DataSource
+                FROM SapBwRawData 
+                WHERE IsActive = 1 
+                AND IsDeleted = 0
+                AND ProcessedDate >= DATEADD(day, -7, GETUTCDATE())
+                GROUP BY CustomerID
+            """)
+            logger.info(f"Retrieved {len(df)} SAP BW customer aggregates")
+            return df
             
-            # Process BW data
-            if not bw_data.empty:
-                bw_customers = bw_data.groupby('CustomerID').agg({
-                    'SalesAmount': 'sum',
-                    'SalesQuantity': 'sum',
-                    'SalesDate': 'max',
-                    'Region': 'first',
-                    'CustomerSegment': 'first',
-                    'SalesRep': 'first'
-                }).reset_index()
-                
-                bw_customers.columns = ['CustomerID', 'TotalSalesAmount', 'TotalQuantity', 'LastOrderDate', 'Region', 'CustomerSegment', 'SalesRep']
-                bw_customers['TotalOrders'] = 0  # BW doesn't have order count
-                bw_customers['DataSource'] = 'SAP_BW'
-                customer_data.append(bw_customers)
+        except Exception as e:
+            logger.error(f"Error retrieving SAP BW customer aggregates: {str(e)}")
+            raise
+
+    def get_product_agg_ecc(self) -> pd.DataFrame:
+        """Retrieve per-product SAP ECC totals, aggregated by the database"""
+        try:
+            df = self._read_raw_db("""
+                SELECT 
+                    ProductCode,
+                    SUM(Quantity) AS TotalQuantitySold,
+                    SUM(TotalAmount) AS TotalSalesAmount,
+                    AVG(UnitPrice) AS UnitPrice,
+                    CAST(NULL AS nvarchar(100)) AS ProductCategory,
+                    'SAP_ECC' AS DataSource
+                FROM SapEccRawData 
+                WHERE IsActive = 1 
+                AND IsDeleted = 0
+                AND ProcessedDate >= DATEADD(day, -7, GETUTCDATE())
+                GROUP BY ProductCode
+            """)
+            logger.info(f"Retrieved {len(df)} SAP ECC product aggregates")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error retrieving SAP ECC product aggregates: {str(e)}")
+            raise
+
+    def get_product_agg_bw(self) -> pd.DataFrame:
+        """Retrieve per-product SAP BW totals, aggregated by the database"""
+        try:
+            df = self._read_raw_db("""
+                SELECT 
+                    ProductCode,
+                    SUM(SalesQuantity) AS TotalQuantitySold,
+                    SUM(SalesAmount) AS TotalSalesAmount,
+                    0 AS UnitPrice,  -- Calculate from amount/quantity if needed
+                    MAX(ProductCategory) AS ProductCategory,
+                    'SAP_BW' AS DataSource
+                FROM SapBwRawData 
+                WHERE IsActive = 1 
+                AND IsDeleted = 0
+                AND ProcessedDate >= DATEADD(day, -7, GETUTCDATE())
+                GROUP BY ProductCode
+            """)
+            logger.info(f"Retrieved {len(df)} SAP BW product aggregates")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error retrieving SAP BW product aggregates: {str(e)}")
+            raise
+
+    def process_customer_data(self, ecc_customers: pd.DataFrame, bw_customers: pd.DataFrame) -> pd.DataFrame:
+        """Combine the per-source customer aggregates into one row per customer"""
+        try:
+            # Combine customer data from both sources
+            customer_data = [df for df in (ecc_customers, bw_customers) if not df.empty]
+            
+            if not customer_data:
+                return pd.DataFrame()
             
-            if customer_data:
+            if len(customer_data) == 1:
+                # A single source is already one row per customer
+                final_customers = customer_data[0]
+            else:
                 # Combine and aggregate
                 combined_customers = pd.concat(customer_data, ignore_index=True)
                 
                 # Final aggregation
-                final_customers = combined_customers.groupby('CustomerID').agg({
+                final_customers = combined_customers.groupby('CustomerID', sort=False).agg({
                     'TotalOrders': 'sum',
                     'TotalSalesAmount': 'sum',
                     'LastOrderDate': 'max',
@@ -161,72 +287,39 @@ class SapDataProcessor:
                     'SalesRep': 'first',
                     'CustomerSegment': 'first'
                 }).reset_index()
-                
-                # Add metadata
-                final_customers['CreatedDate'] = datetime.utcnow()
-                final_customers['UpdatedDate'] = datetime.utcnow()
-                final_customers['IsActive'] = True
-                
-                logger.info(f"Processed {len(final_customers)} unique customers")
-                return final_customers
-            else:
-                return pd.DataFrame()
+            
+            logger.info(f"Processed {len(final_customers)} unique customers")
+            return final_customers
                 
         except Exception as e:
             logger.error(f"Error processing customer data: {str(e)}")
             raise
 
-    def process_product_data(self, ecc_data: pd.DataFrame, bw_data: pd.DataFrame) -> pd.DataFrame:
-        """Process and aggregate product data"""
+    def process_product_data(self, ecc_products: pd.DataFrame, bw_products: pd.DataFrame) -> pd.DataFrame:
+        """Combine the per-source product aggregates into one row per product"""
         try:
-            product_data = []
+            product_data = [df for df in (ecc_products, bw_products) if not df.empty]
             
-            # Process ECC data
-            if not ecc_data.empty:
-                ecc_products = ecc_data.groupby('ProductCode').agg({
-                    'Quantity': 'sum',
-                    'TotalAmount': 'sum',
-                    'UnitPrice': 'mean'
-                }).reset_index()
-                
-                ecc_products.columns = ['ProductCode', 'TotalQuantitySold', 'TotalSalesAmount', 'UnitPrice']
-                ecc_products['DataSource'] = 'SAP_ECC'
-                product_data.append(ecc_products)
-            
-            # Process BW data
-            if not bw_data.empty:
-                bw_products = bw_data.groupby('ProductCode').agg({
-                    'SalesQuantity': 'sum',
-                    'SalesAmount': 'sum',
-                    'ProductCategory': 'first'
-                }).reset_index()
-                
-                bw_products.columns = ['ProductCode', 'TotalQuantitySold', 'TotalSalesAmount', 'ProductCategory']
-                bw_products['UnitPrice'] = 0  # Calculate from amount/quantity if needed
-                bw_products['DataSource'] = 'SAP_BW'
-                product_data.append(bw_products)
+            if not product_data:
+                return pd.DataFrame()
             
-            if product_data:
+            if len(product_data) == 1:
+                # A single source is already one row per product
+                final_products = product_data[0]
+            else:
                 # Combine and aggregate
                 combined_products = pd.concat(product_data, ignore_index=True)
                 
                 # Final aggregation
-                final_products = combined_products.groupby('ProductCode').agg({
+                final_products = combined_products.groupby('ProductCode', sort=False).agg({
                     'TotalQuantitySold': 'sum',
                     'TotalSalesAmount': 'sum',
                     'UnitPrice': 'mean',
                     'ProductCategory': 'first'
                 }).reset_index()
-                
-                # Add metadata
-                final_products['CreatedDate'] = datetime.utcnow()
-                final_products['UpdatedDate'] = datetime.utcnow()
-                final_products['IsActive'] = True
-                
-                logger.info(f"Processed {len(final_products)} unique products")
-                return final_products
-            else:
-                return pd.DataFrame()
+            
+            logger.info(f"Processed {len(final_products)} unique products")
+            return final_products
                 
         except Exception as e:
             logger.error(f"Error processing product data: {str(e)}")
@@ -252,17 +345,17 @@ class SapDataProcessor:
                 bw_sales = bw_data[['CustomerID', 'ProductCode', 'SalesDate', 'SalesAmount', 
                                   'SalesQuantity', 'Region', 'Channel', 'SalesRep']].copy()
                 bw_sales['OrderNumber'] = None
-                bw_sales['UnitPrice'] = bw_sales['SalesAmount'] / bw_sales['SalesQuantity']
+                # Zero-quantity rows get a 0 unit price instead of inf, which the decimal column can't store
+                amounts = bw_sales['SalesAmount'].to_numpy(dtype=np.float64)
+                quantities = bw_sales['SalesQuantity'].to_numpy(dtype=np.float64)
+                bw_sales['UnitPrice'] = np.divide(amounts, quantities, out=np.zeros_like(amounts), where=quantities != 0)
                 bw_sales['DataSource'] = 'SAP_BW'
                 sales_data.append(bw_sales)
             
             if sales_data:
+                # CreatedDate/UpdatedDate/IsActive are set by the database (GETUTCDATE(), 1) when saving
                 combined_sales = pd.concat(sales_data, ignore_index=True)
                 
-                # Add metadata
-                combined_sales['CreatedDate'] = datetime.utcnow()
-                combined_sales['IsActive'] = True
-                
                 logger.info(f"Processed {len(combined_sales)} sales records")
                 return combined_sales
             else:
@@ -272,13 +365,31 @@ class SapDataProcessor:
             logger.error(f"Error processing sales data: {str(e)}")
             raise
 
+    def process_all_data(self, ecc_data: pd.DataFrame, bw_data: pd.DataFrame,
+                         ecc_customers: pd.DataFrame, bw_customers: pd.DataFrame,
+                         ecc_products: pd.DataFrame, bw_products: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Build the customer, product and sales frames from the raw sales rows and per-source aggregates"""
+        logger.info("Processing customer data...")
+        customers_df = self.process_customer_data(ecc_customers, bw_customers)
+        
+        logger.info("Processing product data...")
+        products_df = self.process_product_data(ecc_products, bw_products)
+        
+        logger.info("Processing sales data...")
+        sales_df = self.process_sales_data(ecc_data, bw_data)
+        
+        return customers_df, products_df, sales_df
+
     def save_processed_data(self, customers_df: pd.DataFrame, products_df: pd.DataFrame, sales_df: pd.DataFrame):
         """Save processed data to the processed database"""
         try:
             connection_string = self.get_connection_string(use_processed_db=True)
             
-            with pyodbc.connect(connection_string) as conn:
+            # One transaction for the whole save, committed once at the end
+            with _connect(connection_string, autocommit=False) as conn:
+                # One cursor is shared by all save steps so its prepared statements are reused across batches
                 cursor = conn.cursor()
+                cursor.fast_executemany = True
                 
                 # Clear existing data (optional - you might want to keep historical data)
                 # cursor.execute("DELETE FROM Sales WHERE CreatedDate >= DATEADD(day, -1, GETUTCDATE())")
@@ -305,86 +416,130 @@ class SapDataProcessor:
             raise
 
     def _save_customers(self, cursor, customers_df: pd.DataFrame):
-        """Save customer data to database"""
-        for _, row in customers_df.iterrows():
-            cursor.execute("""
-                MERGE Customers AS target
-                USING (SELECT ? AS CustomerID, ? AS CustomerSegment, ? AS Region, ? AS SalesRep, 
-                              ? AS TotalOrders, ? AS TotalSalesAmount, ? AS LastOrderDate) AS source
-                ON target.CustomerID = source.CustomerID
-                WHEN MATCHED THEN
-                    UPDATE SET CustomerSegment = source.CustomerSegment,
-                             Region = source.Region,
-                             SalesRep = source.SalesRep,
-                             TotalOrders = source.TotalOrders,
-                             TotalSalesAmount = source.TotalSalesAmount,
-                             LastOrderDate = source.LastOrderDate,
-                             UpdatedDate = GETUTCDATE()
-                WHEN NOT MATCHED THEN
-                    INSERT (CustomerID, CustomerSegment, Region, SalesRep, TotalOrders, 
-                           TotalSalesAmount, LastOrderDate, CreatedDate, UpdatedDate, IsActive)
-                    VALUES (source.CustomerID, source.CustomerSegment, source.Region, 
-                           source.SalesRep, source.TotalOrders, source.TotalSalesAmount, 
-                           source.LastOrderDate, GETUTCDATE(), GETUTCDATE(), 1);
-            """, row['CustomerID'], row.get('CustomerSegment'), row.get('Region'), 
-                 row.get('SalesRep'), row['TotalOrders'], row['TotalSalesAmount'], 
-                 row['LastOrderDate'])
+        """Save customer data to database: bulk-load a staging table, then apply one set-based MERGE"""
+        cursor.execute("""
+            CREATE TABLE #CustStg (
+                CustomerID nvarchar(50) NOT NULL PRIMARY KEY,
+                CustomerSegment nvarchar(100) NULL,
+                Region nvarchar(100) NULL,
+                SalesRep nvarchar(100) NULL,
+                TotalOrders int NOT NULL,
+                TotalSalesAmount decimal(18,2) NOT NULL,
+                LastOrderDate datetime2(7) NULL
+            )
+        """)
+        
+        columns = ['CustomerID', 'CustomerSegment', 'Region', 'SalesRep', 'TotalOrders', 'TotalSalesAmount', 'LastOrderDate']
+        cursor.setinputsizes([_NVARCHAR_50, _NVARCHAR_100, _NVARCHAR_100, _NVARCHAR_100, _INTEGER, _FLOAT, _DATETIME2])
+        for params in _parameter_batches(customers_df, columns):
+            cursor.executemany("""
+                INSERT INTO #CustStg (CustomerID, CustomerSegment, Region, SalesRep, TotalOrders, 
+                                     TotalSalesAmount, LastOrderDate)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, params)
+        
+        cursor.execute("""
+            MERGE Customers AS target
+            USING #CustStg AS source
+            ON target.CustomerID = source.CustomerID
+            WHEN MATCHED THEN
+                UPDATE SET CustomerSegment = source.CustomerSegment,
+                         Region = source.Region,
+                         SalesRep = source.SalesRep,
+                         TotalOrders = source.TotalOrders,
+                         TotalSalesAmount = source.TotalSalesAmount,
+                         LastOrderDate = source.LastOrderDate,
+                         UpdatedDate = GETUTCDATE()
+            WHEN NOT MATCHED THEN
+                INSERT (CustomerID, CustomerSegment, Region, SalesRep, TotalOrders, 
+                       TotalSalesAmount, LastOrderDate, CreatedDate, UpdatedDate, IsActive)
+                VALUES (source.CustomerID, source.CustomerSegment, source.Region, 
+                       source.SalesRep, source.TotalOrders, source.TotalSalesAmount, 
+                       source.LastOrderDate, GETUTCDATE(), GETUTCDATE(), 1);
+        """)
+        cursor.execute("DROP TABLE #CustStg")
 
     def _save_products(self, cursor, products_df: pd.DataFrame):
-        """Save product data to database"""
-        for _, row in products_df.iterrows():
-            cursor.execute("""
-                MERGE Products AS target
-                USING (SELECT ? AS ProductCode, ? AS ProductCategory, ? AS UnitPrice,
-                              ? AS TotalQuantitySold, ? AS TotalSalesAmount) AS source
-                ON target.ProductCode = source.ProductCode
-                WHEN MATCHED THEN
-                    UPDATE SET ProductCategory = source.ProductCategory,
-                             UnitPrice = source.UnitPrice,
-                             TotalQuantitySold = source.TotalQuantitySold,
-                             TotalSalesAmount = source.TotalSalesAmount,
-                             UpdatedDate = GETUTCDATE()
-                WHEN NOT MATCHED THEN
-                    INSERT (ProductCode, ProductCategory, UnitPrice, TotalQuantitySold, 
-                           TotalSalesAmount, CreatedDate, UpdatedDate, IsActive)
-                    VALUES (source.ProductCode, source.ProductCategory, source.UnitPrice,
-                           source.TotalQuantitySold, source.TotalSalesAmount, 
-                           GETUTCDATE(), GETUTCDATE(), 1);
-            """, row['ProductCode'], row.get('ProductCategory'), row.get('UnitPrice', 0),
-                 row['TotalQuantitySold'], row['TotalSalesAmount'])
+        """Save product data to database: bulk-load a staging table, then apply one set-based MERGE"""
+        cursor.execute("""
+            CREATE TABLE #ProdStg (
+                ProductCode nvarchar(50) NOT NULL PRIMARY KEY,
+                ProductCategory nvarchar(100) NULL,
+                UnitPrice decimal(18,2) NULL,
+                TotalQuantitySold decimal(18,2) NOT NULL,
+                TotalSalesAmount decimal(18,2) NOT NULL
+            )
+        """)
+        
+        columns = ['ProductCode', 'ProductCategory', 'UnitPrice', 'TotalQuantitySold', 'TotalSalesAmount']
+        cursor.setinputsizes([_NVARCHAR_50, _NVARCHAR_100, _FLOAT, _FLOAT, _FLOAT])
+        for params in _parameter_batches(products_df, columns):
+            cursor.executemany("""
+                INSERT INTO #ProdStg (ProductCode, ProductCategory, UnitPrice, TotalQuantitySold, TotalSalesAmount)
+                VALUES (?, ?, ?, ?, ?)
+            """, params)
+        
+        cursor.execute("""
+            MERGE Products AS target
+            USING #ProdStg AS source
+            ON target.ProductCode = source.ProductCode
+            WHEN MATCHED THEN
+                UPDATE SET ProductCategory = source.ProductCategory,
+                         UnitPrice = source.UnitPrice,
+                         TotalQuantitySold = source.TotalQuantitySold,
+                         TotalSalesAmount = source.TotalSalesAmount,
+                         UpdatedDate = GETUTCDATE()
+            WHEN NOT MATCHED THEN
+                INSERT (ProductCode, ProductCategory, UnitPrice, TotalQuantitySold, 
+                       TotalSalesAmount, CreatedDate, UpdatedDate, IsActive)
+                VALUES (source.ProductCode, source.ProductCategory, source.UnitPrice,
+                       source.TotalQuantitySold, source.TotalSalesAmount, 
+                       GETUTCDATE(), GETUTCDATE(), 1);
+        """)
+        cursor.execute("DROP TABLE #ProdStg")
 
     def _save_sales(self, cursor, sales_df: pd.DataFrame):
         """Save sales data to database"""
-        for _, row in sales_df.iterrows():
-            cursor.execute("""
+        columns = ['CustomerID', 'ProductCode', 'OrderNumber', 'SalesDate', 'SalesAmount', 'SalesQuantity',
+                   'UnitPrice', 'Region', 'Channel', 'SalesRep', 'DataSource']
+        cursor.setinputsizes([_NVARCHAR_50, _NVARCHAR_50, _NVARCHAR_50, _DATETIME2, _FLOAT, _FLOAT,
+                              _FLOAT, _NVARCHAR_100, _NVARCHAR_50, _NVARCHAR_100, _NVARCHAR_50])
+        for params in _parameter_batches(sales_df, columns):
+            cursor.executemany("""
                 INSERT INTO Sales (CustomerID, ProductCode, OrderNumber, SalesDate, 
                                  SalesAmount, SalesQuantity, UnitPrice, Region, Channel, 
                                  SalesRep, DataSource, CreatedDate, IsActive)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETUTCDATE(), 1)
-            """, row['CustomerID'], row['ProductCode'], row.get('OrderNumber'), 
-                 row['SalesDate'], row['SalesAmount'], row['SalesQuantity'], 
-                 row.get('UnitPrice', 0), row.get('Region'), row.get('Channel'), 
-                 row.get('SalesRep'), row['DataSource'])
+            """, params)
 
 def process_sap_data() -> str:
     """Main function to process SAP data"""
     try:
         processor = SapDataProcessor()
         
-        # Get raw data
-        logger.info("Retrieving raw SAP data...")
-        ecc_data = processor.get_raw_sap_ecc_data()
-        bw_data = processor.get_raw_sap_bw_data()
+        # Get raw data and the customer/product aggregates (computed by the database; only sales rows are
+        # shipped raw). The queries are independent and each opens its own connection, so they run concurrently;
+        # pyodbc releases the GIL while the driver executes and fetches.
+        logger.info("Retrieving raw SAP data and aggregates...")
+        fetches = [
+            processor.get_raw_sap_ecc_data,
+            processor.get_raw_sap_bw_data,
+            processor.get_customer_agg_ecc,
+            processor.get_customer_agg_bw,
+            processor.get_product_agg_ecc,
+            processor.get_product_agg_bw
+        ]
+        with ThreadPoolExecutor(max_workers=len(fetches)) as executor:
+            # Unpacked straight from map so no future keeps a frame alive after the del below
+            ecc_data, bw_data, ecc_customers, bw_customers, ecc_products, bw_products = executor.map(lambda fetch: fetch(), fetches)
         
         # Process data
-        logger.info("Processing customer data...")
-        customers_df = processor.process_customer_data(ecc_data, bw_data)
+        customers_df, products_df, sales_df = processor.process_all_data(
+            ecc_data, bw_data, ecc_customers, bw_customers, ecc_products, bw_products
+        )
         
-        logger.info("Processing product data...")
-        products_df = processor.process_product_data(ecc_data, bw_data)
-        
-        logger.info("Processing sales data...")
-        sales_df = processor.process_sales_data(ecc_data, bw_data)
+        # The raw frames are not needed once processed; release them before the save builds its parameter batches
+        del ecc_data, bw_data
         
         # Save processed data
         logger.info("Saving processed data...")
@@ -0,0 +1,23 @@
+"""
+SQL Frames Module
+Builds pandas DataFrames from pyodbc result sets; kept apart from sql_pool so the query API does not import pandas
+"""
+
+from typing import Any, List
+import pandas as pd
+import pyodbc
+
+def frame_from_cursor(cursor: pyodbc.Cursor, batch_size: int) -> pd.DataFrame:
+    """Build a DataFrame column by column from the cursor's current result set, fetching it in batches"""
+    columns = [column[0] for column in cursor.description]
+    data: List[List[Any]] = [[] for _ in columns]
+    
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        # Only one batch of Row objects is alive at a time; values are appended straight into their columns
+        for values, batch_values in zip(data, zip(*rows)):
+            values.extend(batch_values)
+    
+    return pd.DataFrame(dict(zip(columns, data)), columns=columns)
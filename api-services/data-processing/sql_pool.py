@@ -0,0 +1,114 @@
+"""
+SQL Connection Pool Module
+Provides a process-wide pool of pyodbc connections reused across function invocations
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+import pyodbc
+
+logger = logging.getLogger(__name__)
+
+# Let the ODBC driver manager pool connections that overflow our own pool
+pyodbc.pooling = True
+
+POOL_SIZE = int(os.environ.get('SQL_POOL_SIZE', '8'))
+IDLE_VALIDATE_SECONDS = float(os.environ.get('SQL_POOL_IDLE_VALIDATE_SECONDS', '60'))
+
+# One LIFO queue per connection string so the most recently used (warmest) connection is reused first
+_POOLS: Dict[str, queue.LifoQueue] = {}
+_POOLS_LOCK = threading.Lock()
+
+def _get_pool(connection_string: str) -> queue.LifoQueue:
+    """Get or lazily create the pool for a connection string"""
+    pool = _POOLS.get(connection_string)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.setdefault(connection_string, queue.LifoQueue(maxsize=POOL_SIZE))
+    return pool
+
+def _is_alive(conn: pyodbc.Connection) -> bool:
+    """Check that an idle connection is still usable"""
+    try:
+        conn.cursor().execute("SELECT 1").fetchone()
+        return True
+    except pyodbc.Error:
+        return False
+
+def _close_quietly(conn: pyodbc.Connection) -> None:
+    try:
+        conn.close()
+    except pyodbc.Error:
+        pass
+
+def _decimal_to_float(value: Optional[bytes]) -> Optional[float]:
+    """Output converter: read DECIMAL/NUMERIC columns straight into float instead of decimal.Decimal"""
+    return float(value) if value is not None else None
+
+def add_decimal_converters(conn: pyodbc.Connection) -> None:
+    """Have a connection return DECIMAL/NUMERIC columns as float"""
+    conn.add_output_converter(pyodbc.SQL_DECIMAL, _decimal_to_float)
+    conn.add_output_converter(pyodbc.SQL_NUMERIC, _decimal_to_float)
+
+def _connect(connection_string: str) -> pyodbc.Connection:
+    """Open a new connection configured once for every borrower"""
+    conn = pyodbc.connect(connection_string)
+    add_decimal_converters(conn)
+    return conn
+
+def _acquire(connection_string: str) -> pyodbc.Connection:
+    """Pop a live connection from the pool or open a new one"""
+    pool = _get_pool(connection_string)
+    while True:
+        try:
+            conn, returned_at = pool.get_nowait()
+        except queue.Empty:
+            return _connect(connection_string)
+
+        if time.monotonic() - returned_at < IDLE_VALIDATE_SECONDS or _is_alive(conn):
+            return conn
+
+        logger.info("Discarding stale pooled SQL connection")
+        _close_quietly(conn)
+
+def _release(connection_string: str, conn: pyodbc.Connection) -> None:
+    """Return a connection to the pool, closing it if the pool is full"""
+    entry: Tuple[pyodbc.Connection, float] = (conn, time.monotonic())
+    try:
+        _get_pool(connection_string).put_nowait(entry)
+    except queue.Full:
+        _close_quietly(conn)
+
+@contextmanager
+def get_conn(connection_string: str, autocommit: bool = True) -> Iterator[pyodbc.Connection]:
+    """
+    Borrow a pooled connection for the duration of a with block.
+    Connections that raised a pyodbc error are discarded instead of returned.
+    Close every cursor before the block exits (e.g. with contextlib.closing): the connection is handed to the
+    next borrower straight away, and a cursor with unread results would leave it busy.
+    """
+    conn = _acquire(connection_string)
+    reusable = True
+    try:
+        conn.autocommit = autocommit
+        yield conn
+    except pyodbc.Error:
+        reusable = False
+        raise
+    finally:
+        if reusable and not autocommit:
+            # Never hand an open transaction to the next borrower
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                reusable = False
+
+        if reusable:
+            _release(connection_string, conn)
+        else:
+            _close_quietly(conn)
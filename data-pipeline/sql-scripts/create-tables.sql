@@ -108,6 +108,26 @@ CREATE TABLE [dbo].[BotContext] (
     CONSTRAINT [PK_BotContext] PRIMARY KEY CLUSTERED ([Id] ASC)
 );
 
+-- Business Insights Table written by the GenerateInsights function
+CREATE TABLE [dbo].[BusinessInsights] (
+    [Id] [uniqueidentifier] NOT NULL DEFAULT NEWID(),
+    [InsightType] [nvarchar](100) NOT NULL,
+    [InsightData] [nvarchar](max) NOT NULL,
+    [GeneratedDate] [datetime2](7) NOT NULL DEFAULT GETUTCDATE(),
+    [IsActive] [bit] NOT NULL DEFAULT 1,
+    CONSTRAINT [PK_BusinessInsights] PRIMARY KEY CLUSTERED ([Id] ASC)
+);
+
+-- Per-category sync state written by the UpdateAISearch function
+CREATE TABLE [dbo].[SearchIndexState] (
+    [IndexName] [nvarchar](100) NOT NULL,
+    [Category] [nvarchar](50) NOT NULL,
+    [SourceChecksum] [int] NULL,
+    [Watermark] [datetime2](7) NULL,
+    [UpdatedDate] [datetime2](7) NOT NULL DEFAULT GETUTCDATE(),
+    CONSTRAINT [PK_SearchIndexState] PRIMARY KEY CLUSTERED ([IndexName] ASC, [Category] ASC)
+);
+
 -- Indexes for better performance
 CREATE NONCLUSTERED INDEX [IX_SapEccRawData_CustomerID] ON [dbo].[SapEccRawData] ([CustomerID]);
 CREATE NONCLUSTERED INDEX [IX_SapEccRawData_OrderNumber] ON [dbo].[SapEccRawData] ([OrderNumber]);
@@ -123,7 +143,163 @@ CREATE NONCLUSTERED INDEX [IX_Sales_CustomerID] ON [dbo].[Sales] ([CustomerID]);
 CREATE NONCLUSTERED INDEX [IX_Sales_ProductCode] ON [dbo].[Sales] ([ProductCode]);
 CREATE NONCLUSTERED INDEX [IX_Sales_SalesDate] ON [dbo].[Sales] ([SalesDate]);
 CREATE NONCLUSTERED INDEX [IX_Sales_Region] ON [dbo].[Sales] ([Region]);
+CREATE NONCLUSTERED INDEX [IX_Sales_IsActive_CreatedDate] ON [dbo].[Sales] ([IsActive], [CreatedDate]);
+CREATE NONCLUSTERED INDEX [IX_Sales_CustomerID_SalesDate] ON [dbo].[Sales] ([CustomerID], [IsActive], [SalesDate] DESC)
+    INCLUDE ([OrderNumber], [ProductCode], [SalesAmount], [SalesQuantity], [UnitPrice], [Region], [Channel], [SalesRep]);
 
 CREATE NONCLUSTERED INDEX [IX_BotContext_UserId] ON [dbo].[BotContext] ([UserId]);
 CREATE NONCLUSTERED INDEX [IX_BotContext_ConversationId] ON [dbo].[BotContext] ([ConversationId]);
 CREATE NONCLUSTERED INDEX [IX_BotContext_LastActivity] ON [dbo].[BotContext] ([LastActivity]);
+GO
+
+-- Table-valued parameter type for multi-customer lookups
+CREATE TYPE [dbo].[CustomerIdList] AS TABLE (
+    [CustomerID] [nvarchar](50) NOT NULL PRIMARY KEY
+);
+GO
+
+-- Returns customer details for every ID in the list in a single round-trip
+CREATE PROCEDURE [dbo].[GetCustomersBulk]
+    @ids [dbo].[CustomerIdList] READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    SELECT
+        c.CustomerID,
+        c.CustomerSegment,
+        c.Region,
+        c.SalesRep,
+        c.TotalOrders,
+        ISNULL(CAST(c.TotalSalesAmount AS FLOAT), 0) AS TotalSalesAmount,
+        CONVERT(VARCHAR(33), c.LastOrderDate, 126) AS LastOrderDate,
+        CONVERT(VARCHAR(33), c.CreatedDate, 126) AS CreatedDate,
+        CONVERT(VARCHAR(33), c.UpdatedDate, 126) AS UpdatedDate
+    FROM [dbo].[Customers] c
+    INNER JOIN @ids i ON c.CustomerID = i.CustomerID
+    WHERE c.IsActive = 1;
+END
+GO
+
+-- The search document procedures below emit every timestamp as datetimeoffset(3), which FOR JSON writes as
+-- yyyy-MM-ddTHH:mm:ss.fff+00:00: the stored values are UTC, and Edm.DateTimeOffset keeps milliseconds only,
+-- so the seven fractional digits of datetime2(7) would be dropped by the index anyway.
+
+-- Builds one AI Search document per active customer as JSON, optionally only rows updated after @since
+CREATE PROCEDURE [dbo].[GetCustomerSearchDocuments]
+    @since [datetime2](7) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    SELECT (
+        SELECT
+            c.CustomerID AS id,
+            CONCAT('Customer: ', c.CustomerID) AS title,
+            CONCAT('Customer ID: ', c.CustomerID, 
+                   CASE WHEN c.CustomerSegment IS NOT NULL THEN CONCAT(', Segment: ', c.CustomerSegment) ELSE '' END,
+                   CASE WHEN c.Region IS NOT NULL THEN CONCAT(', Region: ', c.Region) ELSE '' END,
+                   CASE WHEN c.SalesRep IS NOT NULL THEN CONCAT(', Sales Rep: ', c.SalesRep) ELSE '' END,
+                   ', Total Orders: ', c.TotalOrders,
+                   ', Total Sales: $', FORMAT(c.TotalSalesAmount, 'N2'),
+                   CASE WHEN c.LastOrderDate IS NOT NULL THEN CONCAT(', Last Order: ', FORMAT(c.LastOrderDate, 'yyyy-MM-dd')) ELSE '' END
+            ) AS content,
+            'Customer' AS category,
+            CAST(TODATETIMEOFFSET(c.UpdatedDate, 0) AS [datetimeoffset](3)) AS timestamp,
+            c.CustomerID AS customer_id,
+            NULL AS product_code,
+            c.Region AS region,
+            c.SalesRep AS sales_rep,
+            'Customer' AS data_source,
+            c.TotalSalesAmount AS sales_amount,
+            NULL AS sales_quantity,
+            NULL AS order_number,
+            CAST(TODATETIMEOFFSET(c.LastOrderDate, 0) AS [datetimeoffset](3)) AS sales_date
+        FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES
+    ) AS document
+    FROM [dbo].[Customers] c
+    WHERE c.IsActive = 1
+    AND (@since IS NULL OR c.UpdatedDate > @since);
+END
+GO
+
+-- Builds one AI Search document per active sale from the last @window_days days as JSON,
+-- optionally only rows created at or after @since
+CREATE PROCEDURE [dbo].[GetSalesSearchDocuments]
+    @window_days [int] = 30,
+    @since [datetime2](7) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    SELECT (
+        SELECT
+            CONCAT(s.CustomerID, '-', s.ProductCode, '-', ISNULL(s.OrderNumber, 'NO-ORDER'), '-', FORMAT(s.SalesDate, 'yyyyMMdd')) AS id,
+            CONCAT('Sale: ', s.CustomerID, ' - ', s.ProductCode, 
+                   CASE WHEN s.OrderNumber IS NOT NULL THEN CONCAT(' (Order: ', s.OrderNumber, ')') ELSE '' END
+            ) AS title,
+            CONCAT('Customer: ', s.CustomerID,
+                   ', Product: ', s.ProductCode,
+                   CASE WHEN s.OrderNumber IS NOT NULL THEN CONCAT(', Order: ', s.OrderNumber) ELSE '' END,
+                   ', Date: ', FORMAT(s.SalesDate, 'yyyy-MM-dd'),
+                   ', Amount: $', FORMAT(s.SalesAmount, 'N2'),
+                   ', Quantity: ', s.SalesQuantity,
+                   CASE WHEN s.Region IS NOT NULL THEN CONCAT(', Region: ', s.Region) ELSE '' END,
+                   CASE WHEN s.SalesRep IS NOT NULL THEN CONCAT(', Sales Rep: ', s.SalesRep) ELSE '' END,
+                   ', Source: ', s.DataSource
+            ) AS content,
+            'Sales' AS category,
+            CAST(TODATETIMEOFFSET(s.CreatedDate, 0) AS [datetimeoffset](3)) AS timestamp,
+            s.CustomerID AS customer_id,
+            s.ProductCode AS product_code,
+            s.Region AS region,
+            s.SalesRep AS sales_rep,
+            s.DataSource AS data_source,
+            s.SalesAmount AS sales_amount,
+            s.SalesQuantity AS sales_quantity,
+            s.OrderNumber AS order_number,
+            CAST(TODATETIMEOFFSET(s.SalesDate, 0) AS [datetimeoffset](3)) AS sales_date
+        FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES
+    ) AS document
+    FROM [dbo].[Sales] s
+    WHERE s.IsActive = 1
+    AND s.CreatedDate >= DATEADD(day, -@window_days, GETUTCDATE())
+    AND (@since IS NULL OR s.CreatedDate >= @since);
+END
+GO
+
+-- Builds one AI Search document per active product as JSON, optionally only rows updated after @since
+CREATE PROCEDURE [dbo].[GetProductSearchDocuments]
+    @since [datetime2](7) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    SELECT (
+        SELECT
+            CONCAT('PROD-', p.ProductCode) AS id,
+            CONCAT('Product: ', p.ProductCode) AS title,
+            CONCAT('Product Code: ', p.ProductCode,
+                   CASE WHEN p.ProductCategory IS NOT NULL THEN CONCAT(', Category: ', p.ProductCategory) ELSE '' END,
+                   ', Total Quantity Sold: ', p.TotalQuantitySold,
+                   ', Total Sales: $', FORMAT(p.TotalSalesAmount, 'N2'),
+                   CASE WHEN p.UnitPrice IS NOT NULL THEN CONCAT(', Unit Price: $', FORMAT(p.UnitPrice, 'N2')) ELSE '' END
+            ) AS content,
+            'Product' AS category,
+            CAST(TODATETIMEOFFSET(p.UpdatedDate, 0) AS [datetimeoffset](3)) AS timestamp,
+            NULL AS customer_id,
+            p.ProductCode AS product_code,
+            NULL AS region,
+            NULL AS sales_rep,
+            'Product' AS data_source,
+            p.TotalSalesAmount AS sales_amount,
+            p.TotalQuantitySold AS sales_quantity,
+            NULL AS order_number,
+            NULL AS sales_date
+        FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES
+    ) AS document
+    FROM [dbo].[Products] p
+    WHERE p.IsActive = 1
+    AND (@since IS NULL OR p.UpdatedDate > @since);
+END
+GO
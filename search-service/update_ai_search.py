@@ -3,23 +3,85 @@ Azure AI Search Index Update Module
 Updates the AI Search index with processed SAP data
 """
 
+import asyncio
+import itertools
 import logging
+import random
 import json
-import pandas as pd
-from datetime import datetime
-from typing import Dict, List, Any, Optional
-from azure.search.documents import SearchClient
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
+import pyodbc
+from concurrent.futures import ThreadPoolExecutor
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import SearchIndex, SimpleField, SearchableField, ComplexField
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 import os
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Let the ODBC driver manager reuse connections across runs in the same worker
+pyodbc.pooling = True
+
+# How long Key Vault secrets are reused before being fetched again
+SECRET_CACHE_SECONDS = float(os.environ.get('SECRET_CACHE_SECONDS', '3600'))
+
+FETCH_BATCH_SIZE = int(os.environ.get('SEARCH_FETCH_BATCH_SIZE', '5000'))
+
+# Sales documents older than this many days are kept out of the index
+SALES_WINDOW_DAYS = 30
+
+UPLOAD_BATCH_SIZE = 1000
+UPLOAD_CONCURRENCY = int(os.environ.get('SEARCH_UPLOAD_CONCURRENCY', '8'))
+UPLOAD_MAX_ATTEMPTS = int(os.environ.get('SEARCH_UPLOAD_MAX_ATTEMPTS', '5'))
+
+# Per-document indexing statuses that are transient and worth retrying
+RETRYABLE_STATUS_CODES = {409, 422, 429, 503}
+
+def _connect(connection_string: str) -> pyodbc.Connection:
+    """Open a read-only autocommit SQL connection"""
+    return pyodbc.connect(connection_string, autocommit=True)
+
+def _documents(conn: pyodbc.Connection, query: str, *params: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Stream search documents from a query whose single column is a JSON object per row
+    built server-side with FOR JSON PATH, fetching in batches.
+    """
+    cursor = conn.cursor()
+    cursor.execute(query, *params)
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            return
+        for row in rows:
+            yield json.loads(row[0])
+
+def _close_quietly(conn: pyodbc.Connection) -> None:
+    try:
+        conn.close()
+    except pyodbc.Error:
+        pass
+
+def _prime(documents: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Run a document query up to its first row so several sources can execute concurrently"""
+    first = next(documents, None)
+    if first is None:
+        return iter(())
+    return itertools.chain([first], documents)
+
+def _next_batch(documents: Iterator[Dict[str, Any]], batch_size: int) -> List[Dict[str, Any]]:
+    """Pull the next batch of documents off a stream"""
+    return list(itertools.islice(documents, batch_size))
+
+# (source checksum, watermark) recorded per document category after a successful sync
+SyncState = Tuple[Optional[int], Optional[datetime]]
+
 class AISearchService:
     def __init__(self):
         self.credential = DefaultAzureCredential()
@@ -27,6 +89,10 @@ class AISearchService:
         self.ai_search_endpoint = os.environ.get('AI_SEARCH_ENDPOINT')
         self.ai_search_key = os.environ.get('AI_SEARCH_KEY')
         self.sql_connection_string = os.environ.get('SQL_CONNECTION_STRING')
+        # Key Vault secret name -> (value, monotonic time it was fetched)
+        self._cached_secrets: Dict[str, Tuple[str, float]] = {}
+        self._index_client: Optional[SearchIndexClient] = None
+        self._index_client_credentials: Optional[Tuple[str, str]] = None
         
         if self.key_vault_url:
             self.secret_client = SecretClient(
@@ -36,16 +102,46 @@ class AISearchService:
         else:
             self.secret_client = None
 
+    def _get_secrets(self, names: List[str]) -> Dict[str, str]:
+        """Fetch several Key Vault secrets in parallel so they cost a single round-trip of latency"""
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            values = list(executor.map(lambda name: self.secret_client.get_secret(name).value, names))
+        return dict(zip(names, values))
+
+    def _get_cached_secrets(self, names: List[str]) -> Dict[str, str]:
+        """Get Key Vault secrets, fetching in parallel only those not cached within SECRET_CACHE_SECONDS"""
+        now = time.monotonic()
+        stale = [
+            name for name in names
+            if name not in self._cached_secrets or now - self._cached_secrets[name][1] >= SECRET_CACHE_SECONDS
+        ]
+        if stale:
+            for name, value in self._get_secrets(stale).items():
+                self._cached_secrets[name] = (value, now)
+        return {name: self._cached_secrets[name][0] for name in names}
+
+    def load_secrets(self) -> None:
+        """Fetch every Key Vault setting a run needs that is not set or cached yet, all at once"""
+        if not self.secret_client:
+            return
+        
+        names = []
+        if not (self.ai_search_endpoint and self.ai_search_key):
+            names.extend(["ai-search-endpoint", "ai-search-key"])
+        if not self.sql_connection_string:
+            names.append("sql-connection-string")
+        if names:
+            self._get_cached_secrets(names)
+
     def get_ai_search_credentials(self) -> tuple[str, str]:
-        """Get AI Search endpoint and key from environment or Key Vault"""
+        """Get AI Search endpoint and key from environment or Key Vault, caching the Key Vault values for SECRET_CACHE_SECONDS"""
         try:
             if self.ai_search_endpoint and self.ai_search_key:
                 return self.ai_search_endpoint, self.ai_search_key
             
             if self.secret_client:
-                endpoint_secret = self.secret_client.get_secret("ai-search-endpoint")
-                key_secret = self.secret_client.get_secret("ai-search-key")
-                return endpoint_secret.value, key_secret.value
+                secrets = self._get_cached_secrets(["ai-search-endpoint", "ai-search-key"])
+                return secrets["ai-search-endpoint"], secrets["ai-search-key"]
             
             raise ValueError("No AI Search credentials available")
         except Exception as e:
@@ -53,30 +149,140 @@ class AISearchService:
             raise
 
     def get_sql_connection_string(self) -> str:
-        """Get SQL connection string from environment or Key Vault"""
+        """Get SQL connection string from environment or Key Vault, caching the Key Vault value for SECRET_CACHE_SECONDS"""
         try:
             if self.sql_connection_string:
                 return self.sql_connection_string
             
             if self.secret_client:
-                secret = self.secret_client.get_secret("sql-connection-string")
-                return secret.value
+                return self._get_cached_secrets(["sql-connection-string"])["sql-connection-string"]
             
             raise ValueError("No SQL connection string available")
         except Exception as e:
             logger.error(f"Error getting SQL connection string: {str(e)}")
             raise
 
-    def create_search_index(self, index_name: str = "sap-data-index") -> bool:
-        """Create or update the search index"""
-        try:
-            endpoint, key = self.get_ai_search_credentials()
-            
-            # Create search index client
-            search_index_client = SearchIndexClient(
+    def get_index_client(self) -> SearchIndexClient:
+        """Get the index management client, rebuilding it only when the credentials change"""
+        credentials = self.get_ai_search_credentials()
+        if self._index_client is None or self._index_client_credentials != credentials:
+            endpoint, key = credentials
+            self._index_client = SearchIndexClient(
                 endpoint=endpoint,
                 credential=AzureKeyCredential(key)
             )
+            self._index_client_credentials = credentials
+        return self._index_client
+
+    def create_search_client(self, index_name: str = "sap-data-index") -> AsyncSearchClient:
+        """Create an async document client; open it once per run and share it across uploads and deletes"""
+        endpoint, key = self.get_ai_search_credentials()
+        return AsyncSearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(key),
+            retry_total=UPLOAD_MAX_ATTEMPTS,
+            retry_backoff_factor=0.5
+        )
+
+    def get_source_state(self, conn: pyodbc.Connection) -> Dict[str, SyncState]:
+        """
+        Checksum the columns each slowly changing document category is built from and take its
+        latest UpdatedDate as the next watermark, plus the latest Sales CreatedDate, in one round trip
+        """
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                CHECKSUM_AGG(BINARY_CHECKSUM(CustomerID, CustomerSegment, Region, SalesRep, TotalOrders, TotalSalesAmount, LastOrderDate, UpdatedDate)),
+                MAX(UpdatedDate)
+            FROM Customers WHERE IsActive = 1;
+            
+            SELECT
+                CHECKSUM_AGG(BINARY_CHECKSUM(ProductCode, ProductCategory, UnitPrice, TotalQuantitySold, TotalSalesAmount, UpdatedDate)),
+                MAX(UpdatedDate)
+            FROM Products WHERE IsActive = 1;
+            
+            SELECT MAX(CreatedDate) FROM Sales WHERE IsActive = 1;
+        """)
+        customer_row = cursor.fetchone()
+        cursor.nextset()
+        product_row = cursor.fetchone()
+        cursor.nextset()
+        sales_row = cursor.fetchone()
+        return {
+            'Customer': (customer_row[0], customer_row[1]),
+            'Product': (product_row[0], product_row[1]),
+            'Sales': (None, sales_row[0])
+        }
+
+    def get_active_ids(self, conn: pyodbc.Connection, category: str) -> Set[str]:
+        """Get the document ids a category should currently hold, without building the documents"""
+        queries = {
+            'Customer': "SELECT CustomerID FROM Customers WHERE IsActive = 1",
+            'Product': "SELECT CONCAT('PROD-', ProductCode) FROM Products WHERE IsActive = 1"
+        }
+        cursor = conn.cursor()
+        cursor.execute(queries[category])
+        return {row[0] for row in cursor.fetchall()}
+
+    def load_sync_state(self, conn: pyodbc.Connection, index_name: str = "sap-data-index") -> Dict[str, SyncState]:
+        """Get the checksums and watermarks recorded by the last successful run; empty when none are available"""
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT Category, SourceChecksum, Watermark FROM SearchIndexState WHERE IndexName = ?",
+                index_name
+            )
+            return {category: (checksum, watermark) for category, checksum, watermark in cursor.fetchall()}
+        except pyodbc.Error as e:
+            logger.warning(f"Could not read search index sync state, refreshing every category: {str(e)}")
+            return {}
+
+    def save_sync_state(self, conn: pyodbc.Connection, states: Dict[str, SyncState],
+                        index_name: str = "sap-data-index") -> None:
+        """Record the checksums and watermarks of the categories refreshed by this run"""
+        if not states:
+            return
+        
+        try:
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            # Fixed input sizes so NULL checksums or watermarks bind with the right types
+            cursor.setinputsizes([
+                (pyodbc.SQL_WVARCHAR, 100, 0),
+                (pyodbc.SQL_WVARCHAR, 50, 0),
+                (pyodbc.SQL_INTEGER, 0, 0),
+                (pyodbc.SQL_TYPE_TIMESTAMP, 27, 7)
+            ])
+            cursor.executemany("""
+                MERGE SearchIndexState AS target
+                USING (SELECT ? AS IndexName, ? AS Category, ? AS SourceChecksum, ? AS Watermark) AS source
+                ON target.IndexName = source.IndexName AND target.Category = source.Category
+                WHEN MATCHED THEN
+                    UPDATE SET SourceChecksum = source.SourceChecksum, Watermark = source.Watermark, UpdatedDate = GETUTCDATE()
+                WHEN NOT MATCHED THEN
+                    INSERT (IndexName, Category, SourceChecksum, Watermark)
+                    VALUES (source.IndexName, source.Category, source.SourceChecksum, source.Watermark);
+            """, [(index_name, category, checksum, watermark) for category, (checksum, watermark) in states.items()])
+        except pyodbc.Error as e:
+            logger.warning(f"Could not save search index sync state: {str(e)}")
+
+    def reset_sync_state(self, index_name: str = "sap-data-index") -> None:
+        """Forget the recorded checksums so the next run re-uploads every category"""
+        conn = None
+        try:
+            conn = _connect(self.get_sql_connection_string())
+            conn.cursor().execute("DELETE FROM SearchIndexState WHERE IndexName = ?", index_name)
+        except pyodbc.Error as e:
+            logger.warning(f"Could not reset search index sync state: {str(e)}")
+        finally:
+            if conn is not None:
+                _close_quietly(conn)
+
+    def create_search_index(self, index_name: str = "sap-data-index") -> bool:
+        """Create or update the search index"""
+        try:
+            search_index_client = self.get_index_client()
             
             # Define the search index
             index = SearchIndex(
@@ -87,7 +293,6 @@ class AISearchService:
                     SearchableField(name="content", type="Edm.String"),
                     SimpleField(name="category", type="Edm.String", filterable=True, sortable=True, facetable=True),
                     SimpleField(name="timestamp", type="Edm.DateTimeOffset", filterable=True, sortable=True),
-                    SimpleField(name="metadata", type="Edm.String", filterable=True),
                     SimpleField(name="customer_id", type="Edm.String", filterable=True),
                     SimpleField(name="product_code", type="Edm.String", filterable=True),
                     SimpleField(name="region", type="Edm.String", filterable=True, facetable=True),
@@ -100,6 +305,17 @@ class AISearchService:
                 ]
             )
             
+            # Fields cannot be removed from a live index, so rebuild it when the schema dropped one
+            try:
+                existing_fields = {field.name for field in search_index_client.get_index(index_name).fields}
+            except ResourceNotFoundError:
+                existing_fields = set()
+            
+            if existing_fields - {field.name for field in index.fields}:
+                logger.info(f"Search index {index_name} has fields no longer in the schema, recreating it")
+                search_index_client.delete_index(index_name)
+                self.reset_sync_state(index_name)
+            
             # Create or update the index
             search_index_client.create_or_update_index(index)
             logger.info(f"Successfully created/updated search index: {index_name}")
@@ -109,267 +325,319 @@ class AISearchService:
             logger.error(f"Error creating search index: {str(e)}")
             return False
 
-    def get_customer_documents(self) -> List[Dict[str, Any]]:
-        """Get customer data and convert to search documents"""
+    def get_customer_documents(self, conn: pyodbc.Connection,
+                              since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Get customer data and convert to search documents, optionally only rows updated after since"""
         try:
-            import pyodbc
+            count = 0
+            for document in _documents(conn, "{CALL dbo.GetCustomerSearchDocuments (?)}", since):
+                count += 1
+                yield document
             
-            connection_string = self.get_sql_connection_string()
-            query = """
-                SELECT 
-                    c.CustomerID as id,
-                    CONCAT('Customer: ', c.CustomerID) as title,
-                    CONCAT('Customer ID: ', c.CustomerID, 
-                           CASE WHEN c.CustomerSegment IS NOT NULL THEN CONCAT(', Segment: ', c.CustomerSegment) ELSE '' END,
-                           CASE WHEN c.Region IS NOT NULL THEN CONCAT(', Region: ', c.Region) ELSE '' END,
-                           CASE WHEN c.SalesRep IS NOT NULL THEN CONCAT(', Sales Rep: ', c.SalesRep) ELSE '' END,
-                           ', Total Orders: ', c.TotalOrders,
-                           ', Total Sales: $', FORMAT(c.TotalSalesAmount, 'N2'),
-                           CASE WHEN c.LastOrderDate IS NOT NULL THEN CONCAT(', Last Order: ', FORMAT(c.LastOrderDate, 'yyyy-MM-dd')) ELSE '' END
-                    ) as content,
-                    'Customer' as category,
-                    c.UpdatedDate as timestamp,
-                    CONCAT('CustomerID:', c.CustomerID, '|Segment:', ISNULL(c.CustomerSegment, ''), '|Region:', ISNULL(c.Region, ''), '|SalesRep:', ISNULL(c.SalesRep, '')) as metadata,
-                    c.CustomerID as customer_id,
-                    NULL as product_code,
-                    c.Region as region,
-                    c.SalesRep as sales_rep,
-                    'Customer' as data_source,
-                    c.TotalSalesAmount as sales_amount,
-                    NULL as sales_quantity,
-                    NULL as order_number,
-                    c.LastOrderDate as sales_date
-                FROM Customers c
-                WHERE c.IsActive = 1
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn)
-                
-            documents = df.to_dict('records')
-            logger.info(f"Retrieved {len(documents)} customer documents")
-            return documents
+            logger.info(f"Retrieved {count} customer documents")
             
         except Exception as e:
             logger.error(f"Error getting customer documents: {str(e)}")
-            return []
+            raise
 
-    def get_sales_documents(self) -> List[Dict[str, Any]]:
-        """Get sales data and convert to search documents"""
+    def get_sales_documents(self, conn: pyodbc.Connection,
+                            since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Get sales data from the last SALES_WINDOW_DAYS and convert to search documents, optionally only rows created since"""
         try:
-            import pyodbc
+            count = 0
+            for document in _documents(conn, "{CALL dbo.GetSalesSearchDocuments (?, ?)}", SALES_WINDOW_DAYS, since):
+                count += 1
+                yield document
             
-            connection_string = self.get_sql_connection_string()
-            query = """
-                SELECT 
-                    CONCAT(s.CustomerID, '-', s.ProductCode, '-', ISNULL(s.OrderNumber, 'NO-ORDER'), '-', FORMAT(s.SalesDate, 'yyyyMMdd')) as id,
-                    CONCAT('Sale: ', s.CustomerID, ' - ', s.ProductCode, 
-                           CASE WHEN s.OrderNumber IS NOT NULL THEN CONCAT(' (Order: ', s.OrderNumber, ')') ELSE '' END
-                    ) as title,
-                    CONCAT('Customer: ', s.CustomerID,
-                           ', Product: ', s.ProductCode,
-                           CASE WHEN s.OrderNumber IS NOT NULL THEN CONCAT(', Order: ', s.OrderNumber) ELSE '' END,
-                           ', Date: ', FORMAT(s.SalesDate, 'yyyy-MM-dd'),
-                           ', Amount: $', FORMAT(s.SalesAmount, 'N2'),
-                           ', Quantity: ', s.SalesQuantity,
-                           CASE WHEN s.Region IS NOT NULL THEN CONCAT(', Region: ', s.Region) ELSE '' END,
-                           CASE WHEN s.SalesRep IS NOT NULL THEN CONCAT(', Sales Rep: ', s.SalesRep) ELSE '' END,
-                           ', Source: ', s.DataSource
-                    ) as content,
-                    'Sales' as category,
-                    s.CreatedDate as timestamp,
-                    CONCAT('CustomerID:', s.CustomerID, '|ProductCode:', s.ProductCode, '|OrderNumber:', ISNULL(s.OrderNumber, ''), '|Region:', ISNULL(s.Region, ''), '|SalesRep:', ISNULL(s.SalesRep, ''), '|DataSource:', s.DataSource) as metadata,
-                    s.CustomerID as customer_id,
-                    s.ProductCode as product_code,
-                    s.Region as region,
-                    s.SalesRep as sales_rep,
-                    s.DataSource as data_source,
-                    s.SalesAmount as sales_amount,
-                    s.SalesQuantity as sales_quantity,
-                    s.OrderNumber as order_number,
-                    s.SalesDate as sales_date
-                FROM Sales s
-                WHERE s.IsActive = 1
-                AND s.CreatedDate >= DATEADD(day, -30, GETUTCDATE())
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn)
-                
-            documents = df.to_dict('records')
-            logger.info(f"Retrieved {len(documents)} sales documents")
-            return documents
+            logger.info(f"Retrieved {count} sales documents")
             
         except Exception as e:
             logger.error(f"Error getting sales documents: {str(e)}")
-            return []
+            raise
 
-    def get_product_documents(self) -> List[Dict[str, Any]]:
-        """Get product data and convert to search documents"""
+    def get_product_documents(self, conn: pyodbc.Connection,
+                              since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Get product data and convert to search documents, optionally only rows updated after since"""
         try:
-            import pyodbc
+            count = 0
+            for document in _documents(conn, "{CALL dbo.GetProductSearchDocuments (?)}", since):
+                count += 1
+                yield document
             
-            connection_string = self.get_sql_connection_string()
-            query = """
-                SELECT 
-                    CONCAT('PROD-', p.ProductCode) as id,
-                    CONCAT('Product: ', p.ProductCode) as title,
-                    CONCAT('Product Code: ', p.ProductCode,
-                           CASE WHEN p.ProductCategory IS NOT NULL THEN CONCAT(', Category: ', p.ProductCategory) ELSE '' END,
-                           ', Total Quantity Sold: ', p.TotalQuantitySold,
-                           ', Total Sales: $', FORMAT(p.TotalSalesAmount, 'N2'),
-                           CASE WHEN p.UnitPrice IS NOT NULL THEN CONCAT(', Unit Price: $', FORMAT(p.UnitPrice, 'N2')) ELSE '' END
-                    ) as content,
-                    'Product' as category,
-                    p.UpdatedDate as timestamp,
-                    CONCAT('ProductCode:', p.ProductCode, '|Category:', ISNULL(p.ProductCategory, ''), '|UnitPrice:', ISNULL(CAST(p.UnitPrice AS VARCHAR), '')) as metadata,
-                    NULL as customer_id,
-                    p.ProductCode as product_code,
-                    NULL as region,
-                    NULL as sales_rep,
-                    'Product' as data_source,
-                    p.TotalSalesAmount as sales_amount,
-                    p.TotalQuantitySold as sales_quantity,
-                    NULL as order_number,
-                    NULL as sales_date
-                FROM Products p
-                WHERE p.IsActive = 1
-            """
-            
-            with pyodbc.connect(connection_string) as conn:
-                df = pd.read_sql(query, conn)
-                
-            documents = df.to_dict('records')
-            logger.info(f"Retrieved {len(documents)} product documents")
-            return documents
+            logger.info(f"Retrieved {count} product documents")
             
         except Exception as e:
             logger.error(f"Error getting product documents: {str(e)}")
-            return []
+            raise
 
-    def upload_documents(self, documents: List[Dict[str, Any]], index_name: str = "sap-data-index") -> bool:
-        """Upload documents to the search index"""
+    async def _upload_batch(self, search_client: AsyncSearchClient, batch: List[Dict[str, Any]],
+                            batch_number: int) -> int:
+        """
+        Upload one batch, retrying documents that failed with a transient status using jittered
+        exponential backoff. Returns how many documents still failed.
+        """
+        pending = batch
+        # Documents that failed for good, kept across attempts because each retry only resends the transient ones
+        failed_ids: Set[str] = set()
+        for attempt in range(UPLOAD_MAX_ATTEMPTS):
+            # Merge by stable id so unchanged documents are overwritten in place and retries are idempotent
+            result = await search_client.merge_or_upload_documents(pending)
+            
+            # Check for errors; on the last attempt every remaining failure is permanent
+            failed_docs = [doc for doc in result if not doc.succeeded]
+            retryable = {doc.key for doc in failed_docs if doc.status_code in RETRYABLE_STATUS_CODES}
+            if attempt == UPLOAD_MAX_ATTEMPTS - 1:
+                retryable = set()
+            
+            for doc in failed_docs:
+                if doc.key not in retryable:
+                    logger.warning(f"Failed document: {doc.key}, Error: {doc.error_message}")
+                    failed_ids.add(doc.key)
+            
+            if not retryable:
+                break
+            
+            logger.info(f"Retrying {len(retryable)} documents in batch {batch_number} (attempt {attempt + 2})")
+            pending = [doc for doc in pending if doc["id"] in retryable]
+            await asyncio.sleep(2 ** attempt + random.random())
+        
+        if failed_ids:
+            logger.warning(f"Failed to upload {len(failed_ids)} documents in batch {batch_number}")
+        
+        logger.info(f"Uploaded batch {batch_number} ({len(batch) - len(failed_ids)} of {len(batch)} documents)")
+        return len(failed_ids)
+
+    async def upload_documents(self, search_client: AsyncSearchClient, documents: Iterable[Dict[str, Any]],
+                               semaphore: Optional[asyncio.Semaphore] = None) -> Optional[Tuple[Set[str], int]]:
+        """
+        Upload a stream of documents to the search index.
+        Batches are read off the stream in a worker thread while up to UPLOAD_CONCURRENCY uploads are in flight;
+        pass a shared semaphore to bound several concurrent streams together.
+        Returns the ids that were sent and how many documents failed after retries, or None on failure.
+        """
+        tasks: List[asyncio.Task] = []
         try:
-            endpoint, key = self.get_ai_search_credentials()
-            
-            # Create search client
-            search_client = SearchClient(
-                endpoint=endpoint,
-                index_name=index_name,
-                credential=AzureKeyCredential(key)
-            )
-            
-            # Upload documents in batches
-            batch_size = 1000
-            for i in range(0, len(documents), batch_size):
-                batch = documents[i:i + batch_size]
-                
-                # Convert datetime objects to strings for JSON serialization
-                for doc in batch:
-                    for key, value in doc.items():
-                        if isinstance(value, datetime):
-                            doc[key] = value.isoformat()
-                        elif pd.isna(value):
-                            doc[key] = None
+            document_iter = iter(documents)
+            uploaded_ids: Set[str] = set()
+            semaphore = semaphore or asyncio.Semaphore(UPLOAD_CONCURRENCY)
+            batch_sizes: List[int] = []
+            
+            while True:
+                batch = await asyncio.to_thread(_next_batch, document_iter, UPLOAD_BATCH_SIZE)
+                if not batch:
+                    break
                 
-                # Upload batch
-                result = search_client.upload_documents(batch)
+                uploaded_ids.update(doc["id"] for doc in batch)
+                batch_sizes.append(len(batch))
                 
-                # Check for errors
-                failed_docs = [doc for doc in result if not doc.succeeded]
-                if failed_docs:
-                    logger.warning(f"Failed to upload {len(failed_docs)} documents in batch {i//batch_size + 1}")
-                    for doc in failed_docs:
-                        logger.warning(f"Failed document: {doc.key}, Error: {doc.error_message}")
-                
-                logger.info(f"Uploaded batch {i//batch_size + 1} ({len(batch)} documents)")
+                # Wait for a free slot so only a bounded number of batches are held in memory
+                await semaphore.acquire()
+                task = asyncio.create_task(self._upload_batch(search_client, batch, len(tasks) + 1))
+                # Released on completion rather than inside the coroutine, so a task cancelled before it
+                # started still returns its slot to a semaphore shared with other streams
+                task.add_done_callback(lambda _: semaphore.release())
+                tasks.append(task)
+            
+            # A batch that raised counts as failed in full; the other batches still finish
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            failed = 0
+            for batch_number, (result, size) in enumerate(zip(results, batch_sizes), 1):
+                if isinstance(result, BaseException):
+                    logger.error(f"Error uploading batch {batch_number}: {str(result)}")
+                    failed += size
+                else:
+                    failed += result
             
-            logger.info(f"Successfully uploaded {len(documents)} documents to index {index_name}")
-            return True
+            logger.info(f"Uploaded {len(uploaded_ids) - failed} of {len(uploaded_ids)} documents")
+            return uploaded_ids, failed
             
         except Exception as e:
             logger.error(f"Error uploading documents: {str(e)}")
-            return False
+            return None
+        finally:
+            # Never leave batches running on a client the caller is about to close
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
     def clear_index(self, index_name: str = "sap-data-index") -> bool:
-        """Clear all documents from the search index"""
+        """
+        Clear all documents from the search index.
+        Drops and recreates the index instead of paging through every id and deleting in batches.
+        """
         try:
-            endpoint, key = self.get_ai_search_credentials()
+            self.get_index_client().delete_index(index_name)
+            logger.info(f"Deleted search index: {index_name}")
             
-            # Create search client
-            search_client = SearchClient(
-                endpoint=endpoint,
-                index_name=index_name,
-                credential=AzureKeyCredential(key)
-            )
+            # The emptied index no longer matches the recorded checksums
+            self.reset_sync_state(index_name)
+            
+            return self.create_search_index(index_name)
             
-            # Get all documents and delete them
-            search_results = search_client.search("*", select=["id"])
-            documents_to_delete = []
+        except Exception as e:
+            logger.error(f"Error clearing index: {str(e)}")
+            return False
+
+    async def _delete_documents(self, search_client: AsyncSearchClient, documents_to_delete: List[Dict[str, str]]) -> None:
+        """Delete documents by id in batches"""
+        batch_size = 1000
+        for i in range(0, len(documents_to_delete), batch_size):
+            batch = documents_to_delete[i:i + batch_size]
+            await search_client.delete_documents(batch)
+            logger.info(f"Deleted batch {i//batch_size + 1} ({len(batch)} documents)")
+
+    async def delete_stale_documents(self, search_client: AsyncSearchClient, current_ids: Set[str],
+                                     categories: List[str]) -> bool:
+        """Delete documents of the refreshed categories whose id is no longer produced by the source tables"""
+        if not categories:
+            return True
+        
+        try:
+            # Fetch the indexed ids of those categories once and keep only those missing from this run
+            search_results = await search_client.search(
+                "*",
+                select=["id"],
+                filter=f"search.in(category, '{','.join(categories)}', ',')"
+            )
+            documents_to_delete = [
+                {"id": result["id"]} async for result in search_results
+                if result["id"] not in current_ids
+            ]
             
-            for result in search_results:
-                documents_to_delete.append({"id": result["id"]})
+            await self._delete_documents(search_client, documents_to_delete)
             
             if documents_to_delete:
-                # Delete in batches
-                batch_size = 1000
-                for i in range(0, len(documents_to_delete), batch_size):
-                    batch = documents_to_delete[i:i + batch_size]
-                    search_client.delete_documents(batch)
-                    logger.info(f"Deleted batch {i//batch_size + 1} ({len(batch)} documents)")
-                
-                logger.info(f"Successfully cleared {len(documents_to_delete)} documents from index")
+                logger.info(f"Removed {len(documents_to_delete)} stale documents from index")
             else:
-                logger.info("Index is already empty")
+                logger.info("No stale documents to remove")
             
             return True
             
         except Exception as e:
-            logger.error(f"Error clearing index: {str(e)}")
+            logger.error(f"Error deleting stale documents: {str(e)}")
             return False
 
-    def update_search_index(self) -> str:
+    async def delete_expired_sales(self, search_client: AsyncSearchClient) -> bool:
+        """Delete sales documents that have fallen out of the SALES_WINDOW_DAYS window"""
+        try:
+            cutoff = (datetime.utcnow() - timedelta(days=SALES_WINDOW_DAYS)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            search_results = await search_client.search(
+                "*",
+                select=["id"],
+                filter=f"category eq 'Sales' and timestamp lt {cutoff}"
+            )
+            documents_to_delete = [{"id": result["id"]} async for result in search_results]
+            
+            await self._delete_documents(search_client, documents_to_delete)
+            logger.info(f"Removed {len(documents_to_delete)} expired sales documents from index")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting expired sales documents: {str(e)}")
+            return False
+
+    async def update_search_index(self) -> str:
         """Main function to update the search index with latest data"""
+        connections: List[pyodbc.Connection] = []
         try:
             logger.info("Starting AI Search index update...")
             
+            # Resolve search and SQL secrets together before anything needs them
+            await asyncio.to_thread(self.load_secrets)
+            
             # Create or update the index
-            if not self.create_search_index():
+            if not await asyncio.to_thread(self.create_search_index):
                 return "Failed to create/update search index"
             
-            # Clear existing documents
-            if not self.clear_index():
-                return "Failed to clear existing documents"
-            
-            # Get all documents
-            all_documents = []
+            # Give each source its own pooled connection
+            connection_string = self.get_sql_connection_string()
+            connections = list(await asyncio.gather(
+                *(asyncio.to_thread(_connect, connection_string) for _ in range(3))
+            ))
+            
+            # Customers and Products change rarely; skip them when their checksum matches the last run.
+            # Sales is append-only, so it always runs but only picks up rows created since its watermark.
+            current = await asyncio.to_thread(self.get_source_state, connections[0])
+            previous = await asyncio.to_thread(self.load_sync_state, connections[0])
+            changed = {
+                category: state for category, state in current.items()
+                if category == 'Sales' or category not in previous or previous[category][0] != state[0]
+            }
+            for category in current.keys() - changed.keys():
+                logger.info(f"{category} data unchanged since last run, skipping")
+            
+            # Changed categories with a previous watermark only re-send rows updated since then.
+            # Customer and Product id lists are read separately so deleted rows can still be removed;
+            # incremental Sales instead drops documents that aged out of the window.
+            since = {
+                category: previous[category][1] for category in changed
+                if category in previous and previous[category][1] is not None
+            }
+            current_ids: Set[str] = set()
+            for category in since.keys() - {'Sales'}:
+                current_ids |= await asyncio.to_thread(self.get_active_ids, connections[0], category)
+            
+            getters = {
+                'Customer': self.get_customer_documents,
+                'Sales': self.get_sales_documents,
+                'Product': self.get_product_documents
+            }
+            categories = [category for category in getters if category in changed]
+            
+            # Start every refreshed query at once
+            sources = [
+                getters[category](conn, since.get(category))
+                for category, conn in zip(categories, connections)
+            ]
+            primed = await asyncio.gather(*(asyncio.to_thread(_prime, source) for source in sources))
+            
+            # Pipe each source into its own upload stream; the streams share one bound on in-flight batches
+            async with self.create_search_client() as search_client:
+                semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+                results = await asyncio.gather(
+                    *(self.upload_documents(search_client, source, semaphore) for source in primed),
+                    return_exceptions=True
+                )
+                # A stream that gave up has already cancelled its own batches; the others ran to completion
+                if any(result is None or isinstance(result, BaseException) for result in results):
+                    return "Failed to upload documents to search index"
+                
+                # Then drop only the ids that disappeared since the last run
+                uploaded_ids = set().union(*(ids for ids, _ in results))
+                failed = sum(count for _, count in results)
+                current_ids |= uploaded_ids
+                diffed = [category for category in categories if not (category == 'Sales' and 'Sales' in since)]
+                if not await self.delete_stale_documents(search_client, current_ids, diffed):
+                    return "Failed to remove stale documents from search index"
+                
+                if 'Sales' in since and not await self.delete_expired_sales(search_client):
+                    return "Failed to remove expired sales documents from search index"
             
-            # Get customer documents
-            customer_docs = self.get_customer_documents()
-            all_documents.extend(customer_docs)
+            # Leave the sync state alone after permanent failures so the next run sends those categories again
+            if failed:
+                return f"Updated search index with {len(uploaded_ids)} documents, {failed} failed after retries"
             
-            # Get sales documents
-            sales_docs = self.get_sales_documents()
-            all_documents.extend(sales_docs)
+            await asyncio.to_thread(self.save_sync_state, connections[0], changed)
             
-            # Get product documents
-            product_docs = self.get_product_documents()
-            all_documents.extend(product_docs)
+            if not uploaded_ids:
+                return "No new or changed documents to upload"
             
-            # Upload all documents
-            if all_documents:
-                if self.upload_documents(all_documents):
-                    return f"Successfully updated search index with {len(all_documents)} documents"
-                else:
-                    return "Failed to upload documents to search index"
-            else:
-                return "No documents found to upload"
+            return f"Successfully updated search index with {len(uploaded_ids)} documents"
                 
         except Exception as e:
             logger.error(f"Error updating search index: {str(e)}")
             return f"Error updating search index: {str(e)}"
+        finally:
+            for conn in connections:
+                _close_quietly(conn)
+
+# Reused across invocations so Key Vault secrets and the index client survive between runs
+_SERVICE: Optional[AISearchService] = None
 
-def update_ai_search() -> str:
+async def update_ai_search() -> str:
     """Azure Function entry point for updating AI Search index"""
-    service = AISearchService()
-    return service.update_search_index()
+    global _SERVICE
+    if _SERVICE is None:
+        _SERVICE = AISearchService()
+    return await _SERVICE.update_search_index()